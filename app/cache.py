@@ -0,0 +1,46 @@
+# app/cache.py
+"""
+Small in-process TTL cache for slow upstream reads (Microsoft Graph).
+Entries live per process: each Uvicorn worker keeps its own copy.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+_entries: Dict[Hashable, Tuple[float, Any]] = {}
+_locks: Dict[Hashable, threading.Lock] = {}
+_async_locks: Dict[Hashable, asyncio.Lock] = {}
+
+def cached(key: Hashable, ttl_seconds: float, loader: Callable[[], Any]) -> Any:
+    """Return the value stored under key, calling loader() when it is missing or older than ttl_seconds.
+    Concurrent misses on the same key share one loader call; exceptions are not cached."""
+    entry = _entries.get(key)
+    if entry and time.monotonic() < entry[0]:
+        return entry[1]
+    with _locks.setdefault(key, threading.Lock()):
+        entry = _entries.get(key)
+        if entry and time.monotonic() < entry[0]:
+            return entry[1]
+        value = loader()
+        put(key, value, ttl_seconds)
+        return value
+
+async def cached_async(key: Hashable, ttl_seconds: float, loader: Callable[[], Awaitable[Any]]) -> Any:
+    """cached() for coroutine loaders: waits on an asyncio.Lock instead of blocking the event loop."""
+    entry = _entries.get(key)
+    if entry and time.monotonic() < entry[0]:
+        return entry[1]
+    async with _async_locks.setdefault(key, asyncio.Lock()):
+        entry = _entries.get(key)
+        if entry and time.monotonic() < entry[0]:
+            return entry[1]
+        value = await loader()
+        put(key, value, ttl_seconds)
+        return value
+
+def put(key: Hashable, value: Any, ttl_seconds: float) -> None:
+    _entries[key] = (time.monotonic() + ttl_seconds, value)
+
+def clear() -> None:
+    _entries.clear()
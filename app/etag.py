@@ -0,0 +1,56 @@
+# app/etag.py
+"""
+Conditional GET support: buffered 200 responses to GET/HEAD get a weak ETag
+(hash of the body) and a matching If-None-Match is answered with an empty 304.
+Streaming responses (no Content-Length, e.g. /api/inventory/history) pass through.
+Must sit inside GZipMiddleware so the hash is taken over the uncompressed body.
+"""
+import hashlib
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+class ETagMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start: Message = {}
+        chunks = []
+        passthrough = False
+
+        async def send_with_etag(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] != 200 or "content-length" not in headers or "etag" in headers:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            etag = 'W/"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+            headers = MutableHeaders(raw=start["headers"])
+            if if_none_match and etag in (t.strip() for t in if_none_match.split(",")):
+                del headers["content-length"]
+                del headers["content-type"]
+                headers["etag"] = etag
+                await send({**start, "status": 304})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            headers["etag"] = etag
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_with_etag)
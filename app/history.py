@@ -0,0 +1,37 @@
+# app/history.py
+"""
+InventoryHistory (audit) rows, written in the same transaction as the change they record.
+
+Callers add the rows before their own commit, so an audit row exists exactly when its
+change does: a failed write rolls both back and nothing is queued outside the database.
+Several rows go out as one executemany INSERT. Every write also bumps the InventoryVersion
+counter polled by clients (GET /api/inventory/version).
+"""
+from typing import Dict, Iterable, Optional
+from sqlalchemy import insert, update
+from sqlmodel import Session
+from .inventory_models import InventoryHistory, InventoryVersion, VERSION_ROW_ID
+
+def history_row(action: str, actor: Optional[str] = None, details: Optional[Dict] = None) -> Dict:
+    # no timestamp: the column default stamps it with the database's now()
+    return {"action": action, "actor": actor, "details": details or {}}
+
+def record_history(session: Session, action: str, actor: Optional[str] = None, details: Optional[Dict] = None) -> None:
+    """Add one history row to session's transaction; the caller commits."""
+    record_history_many(session, [history_row(action, actor, details)])
+
+def record_history_many(session: Session, rows: Iterable[Dict]) -> None:
+    """Add pre-built history rows (see history_row) to session's transaction; the caller commits."""
+    rows = list(rows)
+    if rows:
+        session.execute(insert(InventoryHistory.__table__), rows)
+        bump_version(session)
+
+def bump_version(session: Session) -> None:
+    """+1 on the change counter. The UPDATE holds the row lock until the caller commits, so
+    concurrent writers are numbered in commit order and a poller never skips a change."""
+    table = InventoryVersion.__table__
+    bumped = session.execute(update(table).where(table.c.id == VERSION_ROW_ID).values(version=table.c.version + 1))
+    if bumped.rowcount == 0:
+        # create_db_and_tables seeds the row; this covers databases set up without it
+        session.execute(insert(table).values(id=VERSION_ROW_ID, version=1))
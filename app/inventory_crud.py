@@ -1,16 +1,50 @@
 from sqlmodel import Session, select
-from sqlalchemy.exc import SQLAlchemyError
-from .inventory_models import InventoryItem, LicensePool, Assignment, InventoryHistory, Laptop
-from datetime import datetime
-from typing import Optional
-import time
+from sqlalchemy import update, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .inventory_models import InventoryItem, LicensePool, Assignment, Laptop, INVENTORY_ITEM_SETTABLE
+from .history import history_row, record_history, record_history_many
+from typing import Optional, List, Dict
+from functools import lru_cache
+from pydantic import TypeAdapter, create_model
+
+class NotFoundError(ValueError):
+    """A row the request refers to does not exist (HTTP 404 on the bulk endpoints)."""
+
+class ConflictError(ValueError):
+    """The request contradicts the current state of a row (HTTP 409)."""
+
+# columns filled by the database, never taken from a payload
+GENERATED_FIELDS = frozenset({"id", "created_at", "updated_at"})
+
+@lru_cache(maxsize=None)
+def _row_adapter(cls) -> TypeAdapter:
+    """
+    Validator for plain insert rows of a table model, built once per class.
+    Mirrors cls's fields (minus GENERATED_FIELDS) on a non-table model, so a whole list
+    validates inside pydantic-core without instantiating an ORM object per row.
+    """
+    fields = {name: (f.annotation, f) for name, f in cls.model_fields.items() if name not in GENERATED_FIELDS}
+    return TypeAdapter(List[create_model(f"{cls.__name__}Row", **fields)])
+
+def build_insert_rows(cls, records: list) -> List[Dict]:
+    """Validate records against cls and return insert-ready dicts (defaults applied, unknown keys dropped).
+    Raises pydantic.ValidationError; error locs are (row_index, field, ...)."""
+    adapter = _row_adapter(cls)
+    return adapter.dump_python(adapter.validate_python(records))
+
+def keyset_page(stmt, id_column, limit: int, offset: int = 0, after_id: Optional[int] = None):
+    """Order stmt by id_column and page it by key when after_id is given, by offset otherwise."""
+    stmt = stmt.order_by(id_column).limit(limit)
+    if after_id is not None:
+        return stmt.where(id_column > after_id)
+    return stmt.offset(offset)
 
 def create_inventory_item(session: Session, payload: dict, actor: Optional[str] = None) -> InventoryItem:
     item = InventoryItem(**payload)
     session.add(item)
-    session.commit()
-    session.refresh(item)
-    session.add(InventoryHistory(action="create_item", actor=actor, details=item.dict()))
+    session.flush()  # id and timestamps for the history row
+    record_history(session, "create_item", actor, item.model_dump(mode="json"))
     session.commit()
     return item
 
@@ -19,14 +53,12 @@ def update_inventory_item(session: Session, item_id: int, patch: dict, actor: Op
     if not item:
         raise ValueError("Item not found")
     for k, v in patch.items():
-        if hasattr(item, k):
+        if k in INVENTORY_ITEM_SETTABLE:
             setattr(item, k, v)
-    item.updated_at = datetime.utcnow()
     item.version = (item.version or 1) + 1
     session.add(item)
-    session.add(InventoryHistory(action="update_item", actor=actor, details={"id": item_id, "patch": patch}))
+    record_history(session, "update_item", actor, {"id": item_id, "patch": patch})
     session.commit()
-    session.refresh(item)
     return item
 
 def delete_inventory_item(session: Session, item_id: int, actor: Optional[str] = None) -> None:
@@ -34,66 +66,141 @@ def delete_inventory_item(session: Session, item_id: int, actor: Optional[str] =
     if not item:
         raise ValueError("Item not found")
     session.delete(item)
-    session.add(InventoryHistory(action="delete_item", actor=actor, details={"id": item_id}))
+    record_history(session, "delete_item", actor, {"id": item_id})
     session.commit()
 
-def create_license_pool(session: Session, payload: dict, actor: Optional[str] = None) -> LicensePool:
-    lp = LicensePool(**payload)
-    session.add(lp)
+def delete_inventory_items_bulk(session: Session, item_ids: List[int], actor: Optional[str] = None) -> List[int]:
+    """Delete many items in one transaction, all or nothing: any unknown id raises NotFoundError."""
+    # detach linked laptops first, as the ORM does for a single delete
+    session.execute(update(Laptop).where(Laptop.item_id.in_(item_ids)).values(item_id=None))
+    deleted = session.scalars(delete(InventoryItem).where(InventoryItem.id.in_(item_ids)).returning(InventoryItem.id)).all()
+    missing = sorted(set(item_ids) - set(deleted))
+    if missing:
+        session.rollback()
+        raise NotFoundError(f"Item not found: {missing}")
+    record_history_many(session, (history_row("delete_item", actor, {"id": i}) for i in deleted))
     session.commit()
-    session.refresh(lp)
-    session.add(InventoryHistory(action="create_licensepool", actor=actor, details=lp.dict()))
+    return deleted
+
+# dialects with INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+UPSERT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+def create_license_pool(session: Session, payload: dict, actor: Optional[str] = None) -> LicensePool:
+    """
+    Create a license pool, or update the existing pool with the same (unique) sku.
+    On Postgres/SQLite this is a single INSERT ... ON CONFLICT (sku) DO UPDATE ... RETURNING.
+    An update that would set total below the seats already allocated raises ConflictError.
+    """
+    dialect_insert = UPSERT_INSERTS.get(session.get_bind().dialect.name)
+    if dialect_insert is None:
+        lp = LicensePool(**payload)
+        session.add(lp)
+        session.flush()
+    else:
+        validated = LicensePool.model_validate(payload)
+        stmt = dialect_insert(LicensePool).values(**validated.model_dump(exclude=GENERATED_FIELDS))
+        # on conflict only overwrite the fields the caller actually sent
+        provided = validated.model_fields_set - GENERATED_FIELDS - {"sku"}
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["sku"],
+            set_={**{k: stmt.excluded[k] for k in provided}, "updated_at": func.now()},
+            # the existing row is left alone (and nothing returned) if it would end up over-allocated
+            where=LicensePool.allocated <= stmt.excluded.total if "total" in provided else None,
+        ).returning(LicensePool)
+        lp = session.scalars(stmt, execution_options={"populate_existing": True}).first()
+        if lp is None:
+            session.rollback()
+            raise ConflictError(f"License pool {validated.sku} has more seats allocated than total={validated.total}")
+    record_history(session, "create_licensepool", actor, lp.model_dump(mode="json"))
     session.commit()
     return lp
 
-def allocate_license(session: Session, license_id: int, user_upn: str, device_graph_id: Optional[str], actor: str, max_retries: int = 3) -> Assignment:
-    """
-    Atomically increment LicensePool. For Postgres, use SELECT ... FOR UPDATE (can be added later).
-    For SQLite we use simple retry on SQLAlchemyError.
-    """
-    for attempt in range(max_retries):
-        try:
-            lp = session.get(LicensePool, license_id)
-            if not lp:
-                raise ValueError("License pool not found")
-            available = lp.total - lp.allocated
-            if available <= 0:
-                raise ValueError("No available license")
-            lp.allocated += 1
-            session.add(lp)
-            assignment = Assignment(license_id=license_id, user_upn=user_upn, device_graph_id=device_graph_id, assigned_by=actor)
-            session.add(assignment)
-            session.add(InventoryHistory(action="allocate_license", actor=actor, details={
-                "license_id": license_id, "user_upn": user_upn, "device_graph_id": device_graph_id
-            }))
-            session.commit()
-            session.refresh(assignment)
-            session.refresh(lp)
-            return assignment
-        except SQLAlchemyError:
-            session.rollback()
-            if attempt < max_retries - 1:
-                time.sleep(0.1 * (attempt + 1))
-                continue
-            raise
+def allocate_license(session: Session, license_id: int, user_upn: str, device_graph_id: Optional[str], actor: str) -> Assignment:
+    """
+    Atomically increment LicensePool.allocated with a single conditional UPDATE
+    (... WHERE allocated < total): the row lock taken by the UPDATE serializes concurrent
+    allocations and the condition is re-checked under it, so no read-then-write and no retry.
+    """
+    result = session.execute(
+        update(LicensePool)
+        .where(LicensePool.id == license_id, LicensePool.allocated < LicensePool.total)
+        .values(allocated=LicensePool.allocated + 1)
+    )
+    if result.rowcount == 0:
+        session.rollback()
+        if not session.get(LicensePool, license_id):
+            raise NotFoundError("License pool not found")
+        raise ValueError("No available license")
+    assignment = Assignment(license_id=license_id, user_upn=user_upn, device_graph_id=device_graph_id, assigned_by=actor)
+    session.add(assignment)
+    record_history(session, "allocate_license", actor, {
+        "license_id": license_id, "user_upn": user_upn, "device_graph_id": device_graph_id
+    })
+    session.commit()
+    return assignment
 
-def return_license(session: Session, assignment_id: int, actor: str) -> Assignment:
-    a = session.get(Assignment, assignment_id)
-    if not a:
-        raise ValueError("Assignment not found")
-    if a.status != "assigned":
+def allocate_licenses_bulk(session: Session, license_id: int, entries: List[Dict], actor: str) -> List[Assignment]:
+    """
+    Allocate len(entries) seats of one pool in a single transaction: one conditional UPDATE
+    reserves all seats (or none), then the assignments go out as one multi-row INSERT.
+    entries: [{"user_upn": ..., "device_graph_id": ...}, ...]
+    """
+    result = session.execute(
+        update(LicensePool)
+        .where(LicensePool.id == license_id, LicensePool.allocated + len(entries) <= LicensePool.total)
+        .values(allocated=LicensePool.allocated + len(entries))
+    )
+    if result.rowcount == 0:
+        session.rollback()
+        if not session.get(LicensePool, license_id):
+            raise NotFoundError("License pool not found")
+        raise ValueError("Not enough available licenses")
+    assignments = [
+        Assignment(license_id=license_id, user_upn=e.get("user_upn"), device_graph_id=e.get("device_graph_id"), assigned_by=actor)
+        for e in entries
+    ]
+    session.add_all(assignments)
+    record_history_many(session, (
+        history_row("allocate_license", actor, {"license_id": license_id, "user_upn": a.user_upn, "device_graph_id": a.device_graph_id})
+        for a in assignments
+    ))
+    session.commit()
+    return assignments
+
+def _mark_returned(session: Session, assignment_id: int) -> Assignment:
+    """
+    Flip an assignment from assigned to returned with one UPDATE ... RETURNING.
+    The status condition makes concurrent returns of the same assignment race-free:
+    only one of them gets the row back.
+    """
+    a = session.scalars(
+        update(Assignment)
+        .where(Assignment.id == assignment_id, Assignment.status == "assigned")
+        .values(status="returned")
+        .returning(Assignment),
+        execution_options={"populate_existing": True},
+    ).first()
+    if a is None:
+        session.rollback()
+        if not session.get(Assignment, assignment_id):
+            raise NotFoundError("Assignment not found")
         raise ValueError("Assignment not in assigned state")
-    lp = session.get(LicensePool, a.license_id) if a.license_id else None
-    a.status = "returned"
-    session.add(a)
-    if lp:
-        lp.allocated = max(0, lp.allocated - 1)
-        session.add(lp)
-    session.add(InventoryHistory(action="return_license", actor=actor, details={"assignment_id": assignment_id}))
+    return a
+
+def _release_license(session: Session, license_id: int) -> None:
+    # decrement in SQL (never below 0) instead of read-modify-write on a loaded row
+    session.execute(
+        update(LicensePool)
+        .where(LicensePool.id == license_id, LicensePool.allocated > 0)
+        .values(allocated=LicensePool.allocated - 1)
+    )
+
+def return_license(session: Session, assignment_id: int, actor: str) -> Assignment:
+    a = _mark_returned(session, assignment_id)
+    if a.license_id:
+        _release_license(session, a.license_id)
+    record_history(session, "return_license", actor, {"assignment_id": assignment_id})
     session.commit()
-    session.refresh(a)
-    if lp:
-        session.refresh(lp)
     return a
 
 def create_assignment_for_item(session: Session, item_id: int, device_graph_id: Optional[str], user_upn: Optional[str], actor: str) -> Assignment:
@@ -101,73 +208,113 @@ def create_assignment_for_item(session: Session, item_id: int, device_graph_id:
     Assign a physical inventory item (e.g., a laptop) to a device/user.
     This records Assignment with item_id field and writes history.
     """
-    # verify the item exists
-    item = session.get(InventoryItem, item_id)
-    if not item:
+    # verify the item exists and fetch its linked Laptop (if any) in one LEFT JOIN round-trip
+    row = session.execute(
+        select(InventoryItem.id, Laptop)
+        .join(Laptop, Laptop.item_id == InventoryItem.id, isouter=True)
+        .where(InventoryItem.id == item_id)
+    ).first()
+    if row is None:
         raise ValueError("Item not found")
+    _, laptop = row
+    if laptop and laptop.status == "in_use":
+        raise ValueError("Device already assigned")
+
+    # if there's a Laptop record linked to this item, claim it with a conditional UPDATE ... RETURNING:
+    # the status check is re-done under the row lock, so of two concurrent assigns only one matches
+    if laptop:
+        values = {"status": "in_use", "assigned_to_upn": user_upn}
+        if device_graph_id:
+            values["device_graph_id"] = device_graph_id
+        claimed = session.execute(
+            update(Laptop).where(Laptop.id == laptop.id, Laptop.status != "in_use").values(**values).returning(Laptop.id)
+        ).first()
+        if claimed is None:
+            session.rollback()
+            raise ValueError("Device already assigned")
 
     # create the assignment
     assignment = Assignment(item_id=item_id, device_graph_id=device_graph_id, user_upn=user_upn, assigned_by=actor)
     session.add(assignment)
 
-    # if there's a Laptop record linked to this item, update its status and assigned fields
-    laptop = session.exec(select(Laptop).where(Laptop.item_id == item_id)).first()
-    if laptop:
-        if laptop.status == "in_use":
-            raise ValueError("Device already assigned")
-        laptop.status = "in_use"
-        laptop.assigned_to_upn = user_upn
-        if device_graph_id:
-            laptop.device_graph_id = device_graph_id
-        laptop.updated_at = datetime.utcnow()
-        session.add(laptop)
-
-    session.add(InventoryHistory(action="assign_item", actor=actor, details={"item_id": item_id, "user_upn": user_upn, "device_graph_id": device_graph_id}))
+    record_history(session, "assign_item", actor, {"item_id": item_id, "user_upn": user_upn, "device_graph_id": device_graph_id})
     session.commit()
-    session.refresh(assignment)
-    if laptop:
-        session.refresh(laptop)
     return assignment
 
+def assign_items_bulk(session: Session, entries: List[Dict], actor: str) -> List[Assignment]:
+    """
+    Bulk version of create_assignment_for_item, all-or-nothing: one SELECT checks every item
+    (and its laptop), one conditional UPDATE ... RETURNING claims every linked laptop (a laptop
+    assigned meanwhile fails the whole batch), one multi-row INSERT creates the assignments and
+    one executemany UPDATE sets each laptop's user.
+    entries: [{"item_id": ..., "device_graph_id": ..., "user_upn": ...}, ...]
+    """
+    item_ids = [e["item_id"] for e in entries]
+    if len(set(item_ids)) != len(item_ids):
+        raise ValueError("Duplicate item_id in request")
+    rows = session.execute(
+        select(InventoryItem.id, Laptop)
+        .join(Laptop, Laptop.item_id == InventoryItem.id, isouter=True)
+        .where(InventoryItem.id.in_(item_ids))
+    ).all()
+    laptops = {item_id: laptop for item_id, laptop in rows}
+    missing = [i for i in item_ids if i not in laptops]
+    if missing:
+        raise NotFoundError(f"Item not found: {missing}")
+    in_use = [i for i in item_ids if laptops[i] and laptops[i].status == "in_use"]
+    if in_use:
+        raise ValueError(f"Device already assigned: {in_use}")
+
+    claim = {laptops[i].id: i for i in item_ids if laptops[i]}
+    if claim:
+        claimed = session.scalars(
+            update(Laptop).where(Laptop.id.in_(claim), Laptop.status != "in_use").values(status="in_use").returning(Laptop.id)
+        ).all()
+        if len(claimed) != len(claim):
+            session.rollback()
+            raise ValueError(f"Device already assigned: {sorted(claim[i] for i in set(claim) - set(claimed))}")
+
+    assignments = [
+        Assignment(item_id=e["item_id"], device_graph_id=e.get("device_graph_id"), user_upn=e.get("user_upn"), assigned_by=actor)
+        for e in entries
+    ]
+    session.add_all(assignments)
+    laptop_rows = [
+        {"id": laptops[e["item_id"]].id, "status": "in_use", "assigned_to_upn": e.get("user_upn"),
+         "device_graph_id": e.get("device_graph_id") or laptops[e["item_id"]].device_graph_id}
+        for e in entries if laptops[e["item_id"]]
+    ]
+    if laptop_rows:
+        # ORM bulk UPDATE by primary key: a single executemany
+        session.execute(update(Laptop), laptop_rows)
+    record_history_many(session, (
+        history_row("assign_item", actor, {"item_id": e["item_id"], "user_upn": e.get("user_upn"), "device_graph_id": e.get("device_graph_id")})
+        for e in entries
+    ))
+    session.commit()
+    return assignments
+
 def return_assignment(session: Session, assignment_id: int, actor: str) -> Assignment:
     """
     Return an assignment (either a license assignment or an item assignment).
-    Updates assignment.status and any related LicensePool or Laptop state.
+    Updates assignment.status and any related LicensePool or Laptop state,
+    each with a single UPDATE (no rows loaded first).
     """
-    a = session.get(Assignment, assignment_id)
-    if not a:
-        raise ValueError("Assignment not found")
-    if a.status != "assigned":
-        raise ValueError("Assignment not in assigned state")
+    a = _mark_returned(session, assignment_id)
 
     # Handle license return
     if a.license_id:
-        lp = session.get(LicensePool, a.license_id) if a.license_id else None
-        a.status = "returned"
-        session.add(a)
-        if lp:
-            lp.allocated = max(0, lp.allocated - 1)
-            lp.updated_at = datetime.utcnow()
-            session.add(lp)
+        _release_license(session, a.license_id)
     # Handle physical item return
     elif a.item_id:
-        laptop = session.exec(select(Laptop).where(Laptop.item_id == a.item_id)).first()
-        a.status = "returned"
-        session.add(a)
-        if laptop:
-            laptop.status = "in_stock"
-            laptop.assigned_to_upn = None
-            laptop.device_graph_id = None
-            laptop.updated_at = datetime.utcnow()
-            session.add(laptop)
-    else:
-        # unknown assignment type, still mark returned
-        a.status = "returned"
-        session.add(a)
+        session.execute(
+            update(Laptop)
+            .where(Laptop.item_id == a.item_id)
+            .values(status="in_stock", assigned_to_upn=None, device_graph_id=None)
+        )
 
-    session.add(InventoryHistory(action="return_assignment", actor=actor, details={"assignment_id": assignment_id}))
+    record_history(session, "return_assignment", actor, {"assignment_id": assignment_id})
     session.commit()
-    session.refresh(a)
     return a
 
 def return_assignment_by_item(session: Session, item_id: int, actor: str) -> Assignment:
@@ -188,19 +335,43 @@ def create_device_atomic(session: Session, item_payload: dict, laptop_payload: d
     """
     try:
         item = InventoryItem(**item_payload)
-        session.add(item)
-        session.flush()  # ensure id assigned
-        # link item_id to laptop payload if not provided
-        laptop_payload = dict(laptop_payload)
-        if not laptop_payload.get("item_id"):
-            laptop_payload["item_id"] = item.id
         laptop = Laptop(**laptop_payload)
-        session.add(laptop)
-        session.add(InventoryHistory(action="create_device", actor=actor, details={"item": item_payload, "laptop": laptop_payload}))
+        # link to the new item if item_id not provided; one flush emits both RETURNING inserts
+        # (item first, its id fills laptop.item_id), so the history row can read laptop.item_id
+        if not laptop_payload.get("item_id"):
+            laptop.item = item
+        session.add_all([item, laptop])
+        session.flush()
+        record_history(session, "create_device", actor, {"item": item_payload, "laptop": {**laptop_payload, "item_id": laptop.item_id}})
         session.commit()
-        session.refresh(item)
-        session.refresh(laptop)
         return {"item": item, "laptop": laptop}
     except Exception:
         session.rollback()
-        raise
\ No newline at end of file
+        raise
+
+def create_devices_bulk(session: Session, devices: List[Dict], actor: Optional[str] = None) -> List[Dict]:
+    """
+    Bulk version of create_device_atomic: every item+laptop pair in one transaction.
+    The unit of work batches the INSERTs per table (multi-row INSERT ... RETURNING).
+    devices: [{"item": {...}, "laptop": {...}}, ...]; returns [{"item": ..., "laptop": ...}, ...]
+    """
+    try:
+        created = []
+        for d in devices:
+            item = InventoryItem(**(d.get("item") or {}))
+            laptop_payload = d.get("laptop") or {}
+            laptop = Laptop(**laptop_payload)
+            if not laptop_payload.get("item_id"):
+                laptop.item = item
+            created.append({"item": item, "laptop": laptop})
+        session.add_all([obj for pair in created for obj in pair.values()])
+        session.flush()  # laptop item_ids for the history rows
+        record_history_many(session, (
+            history_row("create_device", actor, {"item": d.get("item") or {}, "laptop": {**(d.get("laptop") or {}), "item_id": pair["laptop"].item_id}})
+            for d, pair in zip(devices, created)
+        ))
+        session.commit()
+        return created
+    except Exception:
+        session.rollback()
+        raise
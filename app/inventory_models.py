@@ -1,10 +1,24 @@
 from typing import Optional, Dict
 from enum import Enum
-from sqlmodel import SQLModel, Field, Column
+from sqlmodel import SQLModel, Field, Column, Relationship
 from datetime import datetime
-from sqlalchemy import JSON, Integer
+from sqlalchemy import JSON, Integer, Index, DateTime, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+# created_at / updated_at are filled by the database's now(), so inserts don't build or ship a
+# Python datetime per row. default= puts now() into the INSERT itself: tables created before
+# server_default existed have the NOT NULL column but no DEFAULT, and create_all never alters them.
+def created_at_column() -> Column:
+    return Column(DateTime(timezone=True), default=func.now(), server_default=func.now(), nullable=False)
+
+def updated_at_column() -> Column:
+    return Column(DateTime(timezone=True), default=func.now(), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+# fetch DB-generated timestamps back via RETURNING on insert/update instead of expiring them
+TIMESTAMPED_MAPPER_ARGS = {"eager_defaults": True}
 
 class InventoryItem(SQLModel, table=True):
+    __mapper_args__ = TIMESTAMPED_MAPPER_ARGS
     id: Optional[int] = Field(default=None, primary_key=True)
     sku: str = Field(index=True, nullable=False)
     name: str
@@ -12,28 +26,35 @@ class InventoryItem(SQLModel, table=True):
     quantity: int = Field(default=0)
     location: Optional[str] = None
     metadata_: Optional[Dict] = Field(default_factory=dict, sa_column=Column(JSON))
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: Optional[datetime] = Field(default=None, sa_column=created_at_column())
+    updated_at: Optional[datetime] = Field(default=None, sa_column=updated_at_column())
     version: int = Field(default=1, sa_column=Column(Integer, nullable=False))
+    # 1:1 link to the Laptop record for device items (None for accessories/licenses)
+    laptop: Optional["Laptop"] = Relationship(back_populates="item", sa_relationship_kwargs={"uselist": False})
 
 class LicensePool(SQLModel, table=True):
+    __mapper_args__ = TIMESTAMPED_MAPPER_ARGS
     id: Optional[int] = Field(default=None, primary_key=True)
     sku: str = Field(index=True, nullable=False, unique=True)
     display_name: Optional[str] = None
     total: int = Field(default=0)
     allocated: int = Field(default=0)
     metadata_: Optional[Dict] = Field(default_factory=dict, sa_column=Column(JSON))
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: Optional[datetime] = Field(default=None, sa_column=created_at_column())
+    updated_at: Optional[datetime] = Field(default=None, sa_column=updated_at_column())
 
 class Assignment(SQLModel, table=True):
+    # return_assignment_by_item looks up WHERE item_id=? AND status='assigned'
+    __table_args__ = (Index("ix_assignment_item_active", "item_id", "status"),)
+    __mapper_args__ = TIMESTAMPED_MAPPER_ARGS
+
     id: Optional[int] = Field(default=None, primary_key=True)
     item_id: Optional[int] = Field(default=None, foreign_key="inventoryitem.id", index=True)
     license_id: Optional[int] = Field(default=None, foreign_key="licensepool.id", index=True)
     device_graph_id: Optional[str] = Field(default=None, index=True)
     user_upn: Optional[str] = Field(default=None, index=True)
     assigned_by: Optional[str] = None
-    assigned_at: datetime = Field(default_factory=datetime.utcnow)
+    assigned_at: Optional[datetime] = Field(default=None, sa_column=created_at_column())
     status: str = Field(default="assigned")  # assigned | returned | revoked
     notes: Optional[str] = None
 
@@ -41,8 +62,25 @@ class InventoryHistory(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     action: str  # create/update/allocate/return/delete/bulk_import
     actor: Optional[str] = None
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-    details: Optional[Dict] = Field(default_factory=dict, sa_column=Column(JSON))
+    # filled by the database's now() (in the INSERT itself, like created_at_column) in the
+    # transaction of the change it records.
+    # /history reads ORDER BY timestamp DESC LIMIT n: a backward scan of this index, no sort
+    timestamp: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), default=func.now(), server_default=func.now(), nullable=False, index=True),
+    )
+    # JSONB on Postgres (binary, no re-parse on read); plain JSON elsewhere
+    details: Optional[Dict] = Field(default_factory=dict, sa_column=Column(JSON().with_variant(JSONB(), "postgresql")))
+
+class InventoryVersion(SQLModel, table=True):
+    """
+    Single-row change counter (id=VERSION_ROW_ID) for polling clients. Bumped by app.history in the same
+    transaction as every inventory write, so it moves exactly when a change commits, in commit order.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    version: int = Field(default=0)
+
+VERSION_ROW_ID = 1
 
 # -------------------------
 # DeviceType Enum (chooses device category)
@@ -63,18 +101,27 @@ class Laptop(SQLModel, table=True):
     Laptop record with detailed fields for TEC team.
     - device_type: categorization (Laptop, Monitor, Phone, ...)
     """
+    __mapper_args__ = TIMESTAMPED_MAPPER_ARGS
     id: Optional[int] = Field(default=None, primary_key=True)
-    item_id: Optional[int] = Field(default=None, foreign_key="inventoryitem.id", index=True, nullable=True)
+    item_id: Optional[int] = Field(default=None, foreign_key="inventoryitem.id", index=True, unique=True, nullable=True)
     device_type: DeviceType = Field(default=DeviceType.LAPTOP)
     company: Optional[str] = None
     asset_tag: Optional[str] = Field(default=None, index=True)
     serial: Optional[str] = Field(default=None, index=True)
     model: Optional[str] = None
-    status: str = Field(default="in_stock", description="in_stock | assigned | reserved | retired")
+    status: str = Field(default="in_stock", index=True, description="in_stock | assigned | reserved | retired")
     assigned_to_upn: Optional[str] = Field(default=None, index=True)
     assigned_to_id: Optional[str] = Field(default=None, index=True)
     os: Optional[str] = None
     device_graph_id: Optional[str] = Field(default=None, index=True)  # optional link to Intune managedDevice id
     notes: Optional[Dict] = Field(default_factory=dict, sa_column=Column(JSON))
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    created_at: Optional[datetime] = Field(default=None, sa_column=created_at_column())
+    updated_at: Optional[datetime] = Field(default=None, sa_column=updated_at_column())
+    item: Optional[InventoryItem] = Relationship(back_populates="laptop")
+
+# -------------------------
+# Columns a PATCH may set, computed once at import (PK and DB-maintained timestamps excluded)
+# -------------------------
+PATCH_PROTECTED_FIELDS = frozenset({"id", "created_at", "updated_at"})
+INVENTORY_ITEM_SETTABLE = frozenset(c.name for c in InventoryItem.__table__.columns) - PATCH_PROTECTED_FIELDS
+LAPTOP_SETTABLE = frozenset(c.name for c in Laptop.__table__.columns) - PATCH_PROTECTED_FIELDS
@@ -1,20 +1,66 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from sqlmodel import Session, select
-from typing import List
-from .database import get_session
-from .inventory_models import InventoryItem, LicensePool, Assignment, InventoryHistory, Laptop
+from sqlalchemy import insert, delete, func, case
+from typing import List, Dict, Optional
+from itertools import islice
+from collections import defaultdict
+from pydantic import ValidationError
+import orjson
+from .database import get_session, SessionLocal
+from .history import history_row, record_history, record_history_many
+from .inventory_models import InventoryItem, LicensePool, Assignment, InventoryHistory, InventoryVersion, Laptop, VERSION_ROW_ID
+from .inventory_schemas import (
+    ActorBody, AllocateBody, BulkAllocateBody, AssignBody, BulkAssignBody, IdsBody, UnassignBody,
+    DeviceBody, BulkDevicesBody, BulkImportBody,
+)
 from .inventory_crud import (
-    create_inventory_item, update_inventory_item, delete_inventory_item,
-    create_license_pool, allocate_license, create_assignment_for_item, return_assignment, return_assignment_by_item, create_device_atomic
+    create_inventory_item, update_inventory_item, delete_inventory_item, delete_inventory_items_bulk,
+    create_license_pool, allocate_license, create_assignment_for_item, return_assignment, return_assignment_by_item, create_device_atomic,
+    allocate_licenses_bulk, assign_items_bulk, create_devices_bulk,
+    build_insert_rows, keyset_page, NotFoundError, ConflictError,
 )
 
 router = APIRouter(prefix="/api/inventory", tags=["inventory"])
 
+# Upper bound on rows per executemany batch, by dialect (mssql caps bound parameters,
+# very large batches regress on postgres, sqlite is happy with big ones)
+BULK_BATCH_LIMITS = {"mssql": 900, "postgresql": 1000, "sqlite": 10000, "duckdb": 10000}
+DEFAULT_BULK_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+# rows fetched per round-trip when streaming large read-only lists
+STREAM_CHUNK_SIZE = 100
+
+def _chunks(rows: list, size: int):
+    it = iter(rows)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
 # Inventory items CRUD
-@router.get("/", response_model=List[InventoryItem])
-def list_items(limit: int = 500, offset: int = 0, session: Session = Depends(get_session)):
-    stmt = select(InventoryItem).limit(limit).offset(offset)
-    return session.exec(stmt).all()
+@router.get("/")
+def list_items(limit: int = 500, offset: int = 0, after_id: Optional[int] = None, session: Session = Depends(get_session)):
+    """after_id=<last id seen> pages by key (WHERE id > after_id), which stays cheap on deep pages unlike offset."""
+    stmt = keyset_page(select(*InventoryItem.__table__.c), InventoryItem.id, limit, offset, after_id)
+    # rows straight from the DB: skip ORM objects and response_model revalidation, orjson encodes the dicts
+    return ORJSONResponse([dict(r) for r in session.execute(stmt).mappings()])
+
+@router.get("/stats")
+def inventory_stats(threshold: int = 3, session: Session = Depends(get_session)):
+    """Overview numbers from one aggregate query: {"sku_count", "total_qty", "low_stock_count"}.
+    An item is low on stock when quantity <= threshold."""
+    row = session.execute(select(
+        func.count(),
+        func.coalesce(func.sum(InventoryItem.quantity), 0),
+        func.coalesce(func.sum(case((InventoryItem.quantity <= threshold, 1), else_=0)), 0),
+    ).select_from(InventoryItem)).one()
+    return {"sku_count": row[0], "total_qty": row[1], "low_stock_count": row[2]}
+
+@router.get("/version")
+def inventory_version(session: Session = Depends(get_session)):
+    """Change token for polling clients: the InventoryVersion counter, bumped in the same
+    transaction as every mutation. Primary-key lookup of one row, safe to poll often."""
+    stmt = select(InventoryVersion.version).where(InventoryVersion.id == VERSION_ROW_ID)
+    return {"version": session.execute(stmt).scalar() or 0}
 
 @router.post("/", status_code=201)
 def api_create_item(payload: dict, session: Session = Depends(get_session)):
@@ -41,6 +87,18 @@ def api_delete_item(item_id: int, session: Session = Depends(get_session)):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/bulk_delete")
+def api_delete_items_bulk(body: IdsBody, session: Session = Depends(get_session)):
+    """Delete several items in one request/transaction: {"ids": [...]} -> {"deleted": [...]}.
+    All or nothing: an unknown id answers 404 and nothing is deleted."""
+    try:
+        return {"deleted": delete_inventory_items_bulk(session, body.ids, actor=body.actor)}
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        session.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
 # License pools
 @router.get("/licenses", response_model=List[LicensePool])
 def list_licenses(session: Session = Depends(get_session)):
@@ -52,132 +110,221 @@ def create_license_pool_endpoint(payload: dict, session: Session = Depends(get_s
     try:
         lp = create_license_pool(session, payload, actor=payload.get("actor"))
         return lp
+    except ConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/licenses/{license_id}/allocate")
-def api_allocate_license(license_id: int, body: dict, session: Session = Depends(get_session)):
-    user_upn = body.get("user_upn")
-    device_graph_id = body.get("device_graph_id")
-    actor = body.get("actor", "unknown")
+def api_allocate_license(license_id: int, body: AllocateBody, session: Session = Depends(get_session)):
     try:
-        assignment = allocate_license(session, license_id, user_upn, device_graph_id, actor)
+        assignment = allocate_license(session, license_id, body.user_upn, body.device_graph_id, body.actor)
         return assignment
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/licenses/{license_id}/allocate/bulk", status_code=201)
+def api_allocate_licenses_bulk(license_id: int, body: BulkAllocateBody, session: Session = Depends(get_session)):
+    """Body: {"items": [{"user_upn": "...", "device_graph_id": "..."}, ...], "actor": "name"}. All or nothing."""
+    try:
+        return allocate_licenses_bulk(session, license_id, [e.model_dump() for e in body.items], body.actor)
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Assign physical item (e.g., laptop) endpoint
 @router.post("/assign", status_code=201)
-def api_assign_item(body: dict, session: Session = Depends(get_session)):
-    item_id = body.get("item_id")
-    device_graph_id = body.get("device_graph_id")
-    user_upn = body.get("user_upn")
-    actor = body.get("actor", "unknown")
-    if not item_id:
-        raise HTTPException(status_code=400, detail="item_id required")
+def api_assign_item(body: AssignBody, session: Session = Depends(get_session)):
     try:
-        assignment = create_assignment_for_item(session, item_id, device_graph_id, user_upn, actor)
+        assignment = create_assignment_for_item(session, body.item_id, body.device_graph_id, body.user_upn, body.actor)
         return assignment
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/assign/bulk", status_code=201)
+def api_assign_items_bulk(body: BulkAssignBody, session: Session = Depends(get_session)):
+    """Body: {"items": [{"item_id": 1, "user_upn": "...", "device_graph_id": "..."}, ...], "actor": "name"}. All or nothing."""
+    try:
+        return assign_items_bulk(session, [e.model_dump() for e in body.items], body.actor)
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/assignments/{assignment_id}/return")
-def api_return_assignment(assignment_id: int, body: dict, session: Session = Depends(get_session)):
-    actor = body.get("actor", "unknown")
+def api_return_assignment(assignment_id: int, body: ActorBody, session: Session = Depends(get_session)):
     try:
-        a = return_assignment(session, assignment_id, actor)
+        a = return_assignment(session, assignment_id, body.actor)
         return a
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # Devices views: list laptops by status
+def _devices_by_status(session: Session, status: str, fields: Optional[str]):
+    if fields == "count":
+        # count only: the indexed status column answers this without loading rows
+        n = session.scalar(select(func.count()).select_from(Laptop).where(Laptop.status == status))
+        return ORJSONResponse({"count": n})
+    return session.exec(select(Laptop).where(Laptop.status == status)).all()
+
 @router.get("/devices/in_use", response_model=List[Laptop])
-def list_devices_in_use(session: Session = Depends(get_session)):
-    stmt = select(Laptop).where(Laptop.status == "in_use")
-    return session.exec(stmt).all()
+def list_devices_in_use(fields: Optional[str] = None, session: Session = Depends(get_session)):
+    """?fields=count returns {"count": n} instead of the rows."""
+    return _devices_by_status(session, "in_use", fields)
 
 @router.get("/devices/in_stock", response_model=List[Laptop])
-def list_devices_in_stock(session: Session = Depends(get_session)):
-    stmt = select(Laptop).where(Laptop.status == "in_stock")
-    return session.exec(stmt).all()
+def list_devices_in_stock(fields: Optional[str] = None, session: Session = Depends(get_session)):
+    """?fields=count returns {"count": n} instead of the rows."""
+    return _devices_by_status(session, "in_stock", fields)
+
+@router.get("/devices/status_counts", response_model=Dict[str, int])
+def device_status_counts(session: Session = Depends(get_session)):
+    """Laptop count per status, e.g. {"in_use": 12, "in_stock": 30}, from one GROUP BY."""
+    rows = session.execute(select(Laptop.status, func.count()).group_by(Laptop.status)).all()
+    return {status: n for status, n in rows}
 
 @router.delete("/devices/{laptop_id}")
 def delete_device(laptop_id: int, session: Session = Depends(get_session)):
     """Delete a device by deleting both the Laptop record and its associated InventoryItem"""
-    # First find the laptop
-    laptop = session.get(Laptop, laptop_id)
-    if not laptop:
+    # DELETE ... RETURNING hands back what the history row needs, no SELECT first
+    row = session.execute(delete(Laptop).where(Laptop.id == laptop_id).returning(Laptop.item_id, Laptop.serial)).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Laptop not found")
-    
-    # Get the item_id before deleting laptop
-    item_id = laptop.item_id
-    
-    # Delete the laptop
-    session.delete(laptop)
-    
-    # Delete the associated inventory item if it exists
+    item_id, serial = row
     if item_id:
-        item = session.get(InventoryItem, item_id)
-        if item:
-            session.delete(item)
-    
-    # Add history
-    session.add(InventoryHistory(
-        action="delete_device",
-        actor="ui_user",
-        details={"laptop_id": laptop_id, "item_id": item_id, "serial": laptop.serial}
-    ))
-    
+        session.execute(delete(InventoryItem).where(InventoryItem.id == item_id))
+    record_history(session, "delete_device", "ui_user", {"laptop_id": laptop_id, "item_id": item_id, "serial": serial})
     session.commit()
     return {"message": "Device deleted successfully", "laptop_id": laptop_id, "item_id": item_id}
 
+@router.post("/devices/bulk_delete")
+def delete_devices_bulk(body: IdsBody, session: Session = Depends(get_session)):
+    """Delete several devices (Laptop rows and their InventoryItems) in one transaction.
+    {"ids": [laptop ids]} -> {"deleted": [laptop ids], "item_ids": [...]}.
+    All or nothing: an unknown id answers 404 and nothing is deleted."""
+    rows = session.execute(delete(Laptop).where(Laptop.id.in_(body.ids)).returning(Laptop.id, Laptop.item_id, Laptop.serial)).all()
+    missing = sorted(set(body.ids) - {r.id for r in rows})
+    if missing:
+        session.rollback()
+        raise HTTPException(status_code=404, detail=f"Laptop not found: {missing}")
+    item_ids = [r.item_id for r in rows if r.item_id]
+    if item_ids:
+        session.execute(delete(InventoryItem).where(InventoryItem.id.in_(item_ids)))
+    record_history_many(session, (
+        history_row("delete_device", body.actor, {"laptop_id": r.id, "item_id": r.item_id, "serial": r.serial}) for r in rows
+    ))
+    session.commit()
+    return {"deleted": [r.id for r in rows], "item_ids": item_ids}
 
 @router.post("/assignments/unassign_by_item")
-def api_unassign_by_item(body: dict, session: Session = Depends(get_session)):
+def api_unassign_by_item(body: UnassignBody, session: Session = Depends(get_session)):
     """Unassign (check-in) a device by InventoryItem id. Body: {"item_id": <int>, "actor": "name"}
     This finds the active assignment for the item and returns it.
     """
-    item_id = body.get("item_id")
-    actor = body.get("actor", "unknown")
-    if not item_id:
-        raise HTTPException(status_code=400, detail="item_id required")
     try:
-        a = return_assignment_by_item(session, int(item_id), actor)
+        a = return_assignment_by_item(session, body.item_id, body.actor)
         return a
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # History / audit
-@router.get("/history", response_model=List[InventoryHistory])
-def get_history(limit: int = 500, session: Session = Depends(get_session)):
-    stmt = select(InventoryHistory).order_by(InventoryHistory.timestamp.desc()).limit(limit)
-    return session.exec(stmt).all()
+# columns listed when details aren't wanted (details is the only wide one)
+HISTORY_SUMMARY_COLUMNS = (InventoryHistory.id, InventoryHistory.timestamp, InventoryHistory.action, InventoryHistory.actor)
+
+HISTORY_ORDERS = {"timestamp.desc": InventoryHistory.timestamp.desc(), "timestamp.asc": InventoryHistory.timestamp.asc()}
+
+def _iter_history_json(limit: int, include_details: bool = True, order: str = "timestamp.desc"):
+    """Yield the history list as a JSON array, STREAM_CHUNK_SIZE rows at a time."""
+    columns = InventoryHistory.__table__.c if include_details else HISTORY_SUMMARY_COLUMNS
+    # plain column rows: no ORM objects to build, orjson encodes the row mappings directly
+    stmt = select(*columns).order_by(HISTORY_ORDERS[order]).limit(limit)
+    # own session: the response body is streamed after the endpoint (and its dependencies) return
+    with SessionLocal() as session:
+        result = session.execute(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE)).mappings()
+        sep = b"["
+        for rows in result.partitions():
+            yield sep + b",".join(orjson.dumps(dict(r)) for r in rows)
+            sep = b","
+        yield b"]" if sep == b"," else b"[]"
+
+@router.get("/history")
+def get_history(limit: int = 500, include_details: bool = True, order: str = "timestamp.desc"):
+    """include_details=false returns only id, timestamp, action, actor; order is timestamp.desc or timestamp.asc."""
+    if order not in HISTORY_ORDERS:
+        raise HTTPException(status_code=400, detail=f"Unsupported order: {order}")
+    # read-only and potentially large: stream orjson-encoded rows, skip response_model revalidation
+    return StreamingResponse(_iter_history_json(limit, include_details, order), media_type="application/json")
+
+# Several list reads in one round trip (inventory page load)
+BUNDLE_DEFAULT_LIMIT = 500
+BUNDLE_QUERIES = {
+    "items": lambda limit: keyset_page(select(*InventoryItem.__table__.c), InventoryItem.id, limit),
+    "licenses": lambda limit: select(*LicensePool.__table__.c).order_by(LicensePool.id).limit(limit),
+    "history": lambda limit: select(*InventoryHistory.__table__.c).order_by(InventoryHistory.timestamp.desc()).limit(limit),
+}
+
+@router.get("/bundle")
+def get_bundle(parts: str = "items,licenses,history", session: Session = Depends(get_session)):
+    """parts=items:500,licenses,history:200 returns {"items:500": [...], "licenses": [...], "history:200": [...]};
+    each part is the same rows as its list endpoint, ":n" sets the row limit."""
+    out = {}
+    for part in parts.split(","):
+        name, _, limit = part.strip().partition(":")
+        if name not in BUNDLE_QUERIES or (limit and not limit.isdigit()):
+            raise HTTPException(status_code=400, detail=f"Unknown bundle part: {part}")
+        stmt = BUNDLE_QUERIES[name](int(limit) if limit else BUNDLE_DEFAULT_LIMIT)
+        out[part.strip()] = [dict(r) for r in session.execute(stmt).mappings()]
+    return ORJSONResponse(out)
 
 # Bulk import
 @router.post("/bulk_import")
-def bulk_import(payload: dict, session: Session = Depends(get_session)):
-    items = payload.get("items") or []
-    if not items:
-        raise HTTPException(status_code=400, detail="No items")
+def bulk_import(payload: BulkImportBody, batch_size: int = DEFAULT_BULK_BATCH_SIZE, session: Session = Depends(get_session)):
+    """
+    Body: {"items": [...], "batch_size": 1000, "commit_per_batch": false}
+    Rows are inserted in batches of batch_size (capped per dialect). By default the whole
+    import is one transaction; commit_per_batch=true commits after every batch instead.
+    """
+    items = payload.items
+    batch_size = payload.batch_size or batch_size
+    if batch_size <= 0:
+        raise HTTPException(status_code=400, detail="batch_size must be positive")
+    dialect = session.get_bind().dialect.name
+    batch_size = min(batch_size, BULK_BATCH_LIMITS.get(dialect, DEFAULT_BULK_BATCH_SIZE))
+    commit_per_batch = payload.commit_per_batch
+    # validate every record before touching the DB; any invalid row rejects the whole import
+    try:
+        item_rows = build_insert_rows(InventoryItem, items)
+    except ValidationError as e:
+        by_row = defaultdict(list)
+        for err in e.errors(include_url=False, include_context=False, include_input=False):
+            by_row[err["loc"][0]].append({**err, "loc": err["loc"][1:]})
+        errors = [{"row": row, "errors": errs} for row, errs in sorted(by_row.items())]
+        raise HTTPException(status_code=400, detail={"message": f"{len(errors)} invalid record(s), nothing imported", "errors": errors[:MAX_REPORTED_ERRORS]})
+    history_rows = [history_row("bulk_import", rec.get("actor", "bulk"), rec) for rec in items]
     imported = 0
-    for rec in items:
-        try:
-            # Use metadata_ field name here as your model expects metadata_
-            item = InventoryItem(**rec)
-            session.add(item)
-            session.add(InventoryHistory(action="bulk_import", actor=rec.get("actor", "bulk"), details=rec))
-            imported += 1
-        except Exception as e:
-            session.rollback()
-            raise HTTPException(status_code=400, detail=f"Error importing record: {e}")
-    session.commit()
-    return {"imported": imported}
+    try:
+        for item_chunk, history_chunk in zip(_chunks(item_rows, batch_size), _chunks(history_rows, batch_size)):
+            # Core insert on the Table: one executemany per chunk, no ORM bulk grouping by None-ness
+            session.execute(insert(InventoryItem.__table__), item_chunk)
+            record_history_many(session, history_chunk)
+            if commit_per_batch:
+                session.commit()
+            else:
+                session.flush()
+            imported += len(item_chunk)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        committed = imported if commit_per_batch else 0
+        raise HTTPException(status_code=400, detail=f"Error importing records ({committed} committed): {e}")
+    return {"imported": imported, "batch_size": batch_size}
 
 # -------------------------
 # Atomic device create endpoint (create InventoryItem + Laptop in one transaction)
 # -------------------------
 @router.post("/devices", status_code=201)
-def create_device_endpoint(body: dict, session: Session = Depends(get_session)):
+def create_device_endpoint(body: DeviceBody, session: Session = Depends(get_session)):
     """
     Body example:
     {
@@ -186,13 +333,16 @@ def create_device_endpoint(body: dict, session: Session = Depends(get_session)):
       "actor": "admin"
     }
     """
-    item_payload = body.get("item") or {}
-    laptop_payload = body.get("laptop") or {}
-    actor = body.get("actor")
-    if not item_payload:
-        raise HTTPException(status_code=400, detail="item payload required")
     try:
-        res = create_device_atomic(session, item_payload, laptop_payload, actor=actor)
+        res = create_device_atomic(session, body.item, body.laptop, actor=body.actor)
         return {"item": res["item"], "laptop": res["laptop"]}
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/devices/bulk", status_code=201)
+def create_devices_bulk_endpoint(body: BulkDevicesBody, session: Session = Depends(get_session)):
+    """Body: {"devices": [{"item": {...}, "laptop": {...}}, ...], "actor": "admin"} (see /devices). All or nothing."""
+    try:
+        return create_devices_bulk(session, [d.model_dump() for d in body.devices], actor=body.actor)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,64 @@
+# app/inventory_schemas.py
+"""
+Request bodies for the inventory endpoints. FastAPI validates these with
+pydantic-core before the handler runs (unknown keys are ignored).
+"""
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+class ActorBody(BaseModel):
+    actor: str = "unknown"
+
+class AllocateBody(BaseModel):
+    user_upn: Optional[str] = None
+    device_graph_id: Optional[str] = None
+    actor: str = "unknown"
+
+class AllocateEntry(BaseModel):
+    user_upn: Optional[str] = None
+    device_graph_id: Optional[str] = None
+
+class BulkAllocateBody(BaseModel):
+    items: List[AllocateEntry] = Field(min_length=1)
+    actor: str = "unknown"
+
+class AssignBody(BaseModel):
+    item_id: int
+    device_graph_id: Optional[str] = None
+    user_upn: Optional[str] = None
+    actor: str = "unknown"
+
+class AssignEntry(BaseModel):
+    item_id: int
+    device_graph_id: Optional[str] = None
+    user_upn: Optional[str] = None
+
+class BulkAssignBody(BaseModel):
+    items: List[AssignEntry] = Field(min_length=1)
+    actor: str = "unknown"
+
+class IdsBody(BaseModel):
+    ids: List[int] = Field(min_length=1)
+    actor: str = "unknown"
+
+class UnassignBody(BaseModel):
+    item_id: int
+    actor: str = "unknown"
+
+class DevicePayload(BaseModel):
+    # item / laptop fields are validated by the table models in create_device_atomic
+    item: Dict[str, Any] = Field(min_length=1)
+    laptop: Dict[str, Any] = Field(default_factory=dict)
+
+class DeviceBody(DevicePayload):
+    actor: Optional[str] = None
+
+class BulkDevicesBody(BaseModel):
+    devices: List[DevicePayload] = Field(min_length=1)
+    actor: Optional[str] = None
+
+class BulkImportBody(BaseModel):
+    # rows stay plain: build_insert_rows validates them and reports errors per row
+    items: List[Any] = Field(min_length=1)
+    batch_size: Optional[int] = Field(default=None, gt=0)
+    commit_per_batch: bool = False
@@ -1,16 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlmodel import Session, select
-from typing import List, Optional
+from sqlalchemy import delete
+from typing import Optional
 from app.database import get_session
-from app.inventory_models import Laptop, InventoryHistory
-from datetime import datetime
+from app.inventory_models import Laptop, LAPTOP_SETTABLE
+from app.history import record_history
+from app.inventory_crud import keyset_page
 
 router = APIRouter(prefix="/api/inventory/laptops", tags=["laptops"])
 
-@router.get("/", response_model=List[Laptop])
-def list_laptops(limit: int = 500, offset: int = 0, session: Session = Depends(get_session)):
-    stmt = select(Laptop).limit(limit).offset(offset)
-    return session.exec(stmt).all()
+@router.get("/")
+def list_laptops(limit: int = 500, offset: int = 0, after_id: Optional[int] = None, session: Session = Depends(get_session)):
+    """after_id=<last id seen> pages by key instead of offset."""
+    stmt = keyset_page(select(*Laptop.__table__.c), Laptop.id, limit, offset, after_id)
+    return ORJSONResponse([dict(r) for r in session.execute(stmt).mappings()])
 
 @router.get("/{laptop_id}", response_model=Optional[Laptop])
 def get_laptop(laptop_id: int, session: Session = Depends(get_session)):
@@ -24,9 +28,9 @@ def create_laptop(payload: dict, session: Session = Depends(get_session)):
     try:
         l = Laptop(**payload)
         session.add(l)
-        session.commit()
-        session.refresh(l)
-        session.add(InventoryHistory(action="create_laptop", actor=payload.get("actor"), details=l.dict()))
+        # eager_defaults: the INSERT ... RETURNING already filled id and timestamps, no refresh SELECT
+        session.flush()
+        record_history(session, "create_laptop", payload.get("actor"), l.model_dump(mode="json"))
         session.commit()
         return l
     except Exception as e:
@@ -39,21 +43,19 @@ def update_laptop(laptop_id: int, patch: dict, session: Session = Depends(get_se
     if not l:
         raise HTTPException(status_code=404, detail="Laptop not found")
     for k, v in patch.items():
-        if hasattr(l, k):
+        if k in LAPTOP_SETTABLE:
             setattr(l, k, v)
-    l.updated_at = datetime.utcnow()
     session.add(l)
-    session.add(InventoryHistory(action="update_laptop", actor=patch.get("actor"), details={"id": laptop_id, "patch": patch}))
+    record_history(session, "update_laptop", patch.get("actor"), {"id": laptop_id, "patch": patch})
     session.commit()
-    session.refresh(l)
     return l
 
 @router.delete("/{laptop_id}", status_code=204)
 def delete_laptop(laptop_id: int, session: Session = Depends(get_session)):
-    l = session.get(Laptop, laptop_id)
-    if not l:
+    # single DELETE ... RETURNING instead of load + ORM delete
+    row = session.execute(delete(Laptop).where(Laptop.id == laptop_id).returning(Laptop.serial)).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Laptop not found")
-    session.delete(l)
-    session.add(InventoryHistory(action="delete_laptop", actor="api", details={"id": laptop_id}))
+    record_history(session, "delete_laptop", "api", {"id": laptop_id, "serial": row.serial})
     session.commit()
     return {}
\ No newline at end of file
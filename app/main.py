@@ -1,41 +1,66 @@
-from fastapi import FastAPI, BackgroundTasks, Depends
+import os
+from datetime import datetime
+from typing import Optional
+from fastapi import FastAPI, BackgroundTasks, Depends, Query
+from fastapi.responses import ORJSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from sqlmodel import Session, select
 from dotenv import load_dotenv
-from .ms_graph import fetch_managed_devices
-from .summary_utils import summarize_devices
-from .database import create_db_and_tables, get_engine
+from .ms_graph import fetch_managed_devices_cached, aclose as close_graph_client
+from . import cache
+from .summary_utils import summarize_devices_cached, with_top_os
+from .database import create_db_and_tables, get_session
 from .models import DeviceSnapshot
-from sqlalchemy.orm import sessionmaker
 from .scheduler import start_scheduler
 from .snapshot_job import run_snapshot_once
+from .etag import ETagMiddleware
 from app.inventory_routes import router as inventory_router
 from app.users_routes import router as users_router
 from app.laptop_routes import router as laptop_router
 load_dotenv()
 
-app = FastAPI(title="Device Management Summary API")
+SUMMARY_TTL_SEC = 300
+# set OPENAPI_URL to an empty value (e.g. in production) to skip the schema and /docs entirely
+OPENAPI_URL = os.getenv("OPENAPI_URL", "/openapi.json") or None
+
+app = FastAPI(title="Device Management Summary API", default_response_class=ORJSONResponse, openapi_url=OPENAPI_URL)
+# unchanged GETs answer If-None-Match with an empty 304; added first so it runs inside gzip
+app.add_middleware(ETagMiddleware)
+# device / inventory lists are large, repetitive JSON: compress anything over 1 KB
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 app.include_router(inventory_router)
 app.include_router(laptop_router)
 app.include_router(users_router)
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     create_db_and_tables()
     start_scheduler(interval_minutes=15)
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await close_graph_client()
+
 @app.get("/api/dashboard/summary")
-def dashboard_summary():
-    devices = fetch_managed_devices()
-    summary = summarize_devices(devices)
-    return summary
+async def dashboard_summary(top_os: Optional[int] = Query(default=None, gt=0)):
+    """top_os=<n> trims by_os to the n most common OS names."""
+    async def build():
+        return summarize_devices_cached(await fetch_managed_devices_cached())
+    # cached; the scheduled snapshot job clears it and re-primes the device list
+    summary = await cache.cached_async("dashboard_summary", SUMMARY_TTL_SEC, build)
+    return with_top_os(summary, top_os) if top_os else summary
 
 @app.get("/api/intune/devices")
-def get_intune_devices():
-    """Fetch devices directly from Microsoft Intune via Graph API"""
+async def get_intune_devices(fields: Optional[str] = None):
+    """Fetch devices directly from Microsoft Intune via Graph API.
+    ?fields=id,deviceName,... keeps only those keys per device (list views need a handful of ~60)."""
     try:
-        devices = fetch_managed_devices()
-        return devices
+        devices = await fetch_managed_devices_cached()
     except Exception as e:
         return {"error": str(e), "devices": []}
+    if fields:
+        keep = [f for f in fields.split(",") if f]
+        devices = [{k: d.get(k) for k in keep} for d in devices]
+    return devices
 
 
 @app.post("/api/dashboard/snapshot")
@@ -43,11 +68,15 @@ def create_snapshot(background_tasks: BackgroundTasks):
     background_tasks.add_task(run_snapshot_once)
     return {"status" : "snapshot_scheduled"}
 
-@app.get("/api/dashboard/snapshots")
-def get_snapshot(limit:int = 100):
-    engine = get_engine()
-    with Session(engine) as session:
-        statement = select(DeviceSnapshot).order_by(DeviceSnapshot.timestamp.desc()).limit(limit)
-        rows = session.exec(statement).all()
+# wide JSON blobs the dashboard never reads (raw_sample holds whole Graph device objects)
+SNAPSHOT_DETAIL_COLUMNS = ("by_os_version", "raw_sample")
 
-        return rows
\ No newline at end of file
+@app.get("/api/dashboard/snapshots")
+def get_snapshot(limit:int = 100, since: Optional[datetime] = None, include_details: bool = True, session: Session = Depends(get_session)):
+    """since=<timestamp> returns only snapshots newer than it (incremental trend refresh);
+    include_details=false leaves out by_os_version and raw_sample."""
+    columns = [c for c in DeviceSnapshot.__table__.c if include_details or c.name not in SNAPSHOT_DETAIL_COLUMNS]
+    statement = select(*columns).order_by(DeviceSnapshot.timestamp.desc()).limit(limit)
+    if since is not None:
+        statement = statement.where(DeviceSnapshot.timestamp > since)
+    return ORJSONResponse([dict(r) for r in session.execute(statement).mappings()])
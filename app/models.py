@@ -1,11 +1,17 @@
 from sqlmodel import SQLModel, Field, Column
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import JSON
+from sqlalchemy import JSON, DateTime, func
 
 class DeviceSnapshot(SQLModel, table=True):
+    # timestamp is filled by the database's now() and returned by the INSERT; default= puts now()
+    # into the INSERT itself for tables created before the column had a server default
+    __mapper_args__ = {"eager_defaults": True}
     id: Optional[int] = Field(default=None, primary_key=True)
-    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
+    timestamp: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), default=func.now(), server_default=func.now(), nullable=False, index=True),
+    )
     total: int = 0
     corporate: int = 0
     personal: int = 0
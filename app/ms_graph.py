@@ -1,11 +1,13 @@
 # If you already have ms_graph.py, merge the fetch_users_cached and get_access_token functions.
 import os
+import asyncio
+import threading
+import time
 import msal
-import requests
+import httpx
 from dotenv import load_dotenv
-from typing import List, Dict
-from functools import lru_cache
-import time
+from typing import List, Dict, Optional
+from . import cache
 
 load_dotenv()
 
@@ -14,54 +16,97 @@ CLIENT_ID = os.getenv("AZURE_CLIENT_ID")
 CLIENT_SECRET = os.getenv("AZURE_CLIENT_SECRET")
 SCOPE = [os.getenv("GRAPH_SCOPE", "https://graph.microsoft.com/.default")]
 GRAPH_API = os.getenv("GRAPH_API", "https://graph.microsoft.com/v1.0")
+MANAGED_DEVICES_KEY = "managed_devices"
+MANAGED_DEVICES_TTL_SEC = 60
+USERS_KEY = "users"
+HTTP_TIMEOUT_SEC = 30
+
+# refresh this long before the token's own expiry
+TOKEN_REFRESH_MARGIN_SEC = 300
+
+# one MSAL app per process so its in-memory token cache survives between calls;
+# built on first use (construction does authority discovery over the network)
+_msal_app = None
+_token = ("", 0.0)  # (access_token, expires_at on the monotonic clock)
+_token_lock = threading.Lock()
+
+def _msal_client() -> msal.ConfidentialClientApplication:
+    global _msal_app
+    if _msal_app is None:
+        _msal_app = msal.ConfidentialClientApplication(
+            CLIENT_ID,
+            authority=f"https://login.microsoftonline.com/{TENANT_ID}",
+            client_credential=CLIENT_SECRET,
+        )
+    return _msal_app
 
 def get_access_token() -> str:
-    app = msal.ConfidentialClientApplication(
-        CLIENT_ID,
-        authority=f"https://login.microsoftonline.com/{TENANT_ID}",
-        client_credential=CLIENT_SECRET,
-    )
-    result = app.acquire_token_for_client(scopes=SCOPE)
-    if "access_token" not in result:
-        raise RuntimeError(f"Unable to acquire token: {result}")
-    return result["access_token"]
+    global _token
+    token, expires_at = _token
+    if token and time.monotonic() < expires_at:
+        return token
+    with _token_lock:
+        token, expires_at = _token
+        if token and time.monotonic() < expires_at:
+            return token
+        app = _msal_client()
+        result = app.acquire_token_silent(SCOPE, account=None) or app.acquire_token_for_client(scopes=SCOPE)
+        if "access_token" not in result:
+            raise RuntimeError(f"Unable to acquire token: {result}")
+        _token = (result["access_token"], time.monotonic() + int(result.get("expires_in", 0)) - TOKEN_REFRESH_MARGIN_SEC)
+        return result["access_token"]
 
-def fetch_managed_devices() -> List[Dict]:
-    token = get_access_token()
-    headers = {"Authorization": f"Bearer {token}"}
-    url = f"{GRAPH_API}/deviceManagement/managedDevices"
-    devices = []
-    while url:
-        resp = requests.get(url, headers=headers, timeout=30)
-        resp.raise_for_status()
-        payload = resp.json()
-        devices.extend(payload.get("value", []))
-        url = payload.get("@odata.nextLink")
-    return devices
+def new_client() -> httpx.AsyncClient:
+    """HTTP/2 client with a keep-alive pool; one connection is multiplexed across page requests."""
+    return httpx.AsyncClient(http2=True, timeout=HTTP_TIMEOUT_SEC, limits=httpx.Limits(max_keepalive_connections=10))
 
-def _fetch_users_from_graph() -> List[Dict]:
-    token = get_access_token()
+# shared by the API's event loop; code running its own loop (asyncio.run) passes its own client
+_client: Optional[httpx.AsyncClient] = None
+
+def _shared_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = new_client()
+    return _client
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def _fetch_all_pages(url: str, client: Optional[httpx.AsyncClient] = None) -> List[Dict]:
+    """Follow @odata.nextLink; the next page is requested before the current one's items are collected."""
+    client = client or _shared_client()
+    # msal is synchronous: keep its token round-trip off the event loop
+    token = await asyncio.to_thread(get_access_token)
     headers = {"Authorization": f"Bearer {token}"}
-    url = f"{GRAPH_API}/users?$select=id,displayName,userPrincipalName&$top=999"
-    users = []
-    while url:
-        resp = requests.get(url, headers=headers, timeout=30)
-        resp.raise_for_status()
-        payload = resp.json()
-        users.extend(payload.get("value", []))
-        url = payload.get("@odata.nextLink")
+    items = []
+    pending = asyncio.ensure_future(client.get(url, headers=headers))
+    try:
+        while pending:
+            resp = await pending
+            resp.raise_for_status()
+            payload = resp.json()
+            next_url = payload.get("@odata.nextLink")
+            pending = asyncio.ensure_future(client.get(next_url, headers=headers)) if next_url else None
+            items.extend(payload.get("value", []))
+    finally:
+        if pending and not pending.done():
+            pending.cancel()
+    return items
+
+async def fetch_managed_devices(client: Optional[httpx.AsyncClient] = None) -> List[Dict]:
+    return await _fetch_all_pages(f"{GRAPH_API}/deviceManagement/managedDevices?$top=999", client)
+
+async def fetch_managed_devices_cached(ttl_seconds: int = MANAGED_DEVICES_TTL_SEC) -> List[Dict]:
+    return await cache.cached_async(MANAGED_DEVICES_KEY, ttl_seconds, fetch_managed_devices)
+
+async def _fetch_users_from_graph(client: Optional[httpx.AsyncClient] = None) -> List[Dict]:
+    users = await _fetch_all_pages(f"{GRAPH_API}/users?$select=id,displayName,userPrincipalName&$top=999", client)
     simplified = [{"id": u.get("id"), "displayName": u.get("displayName"), "userPrincipalName": u.get("userPrincipalName")} for u in users]
     return simplified
 
-# in-process TTL cache
-def fetch_users_cached(ttl_seconds: int = 60) -> List[Dict]:
-    now = int(time.time())
-    if not hasattr(fetch_users_cached, "_cached_at"):
-        fetch_users_cached._cached_at = 0
-        fetch_users_cached._cached_result = []
-    if now - fetch_users_cached._cached_at < ttl_seconds and fetch_users_cached._cached_result:
-        return fetch_users_cached._cached_result
-    result = _fetch_users_from_graph()
-    fetch_users_cached._cached_result = result
-    fetch_users_cached._cached_at = now
-    return result
\ No newline at end of file
+# in-process TTL cache (expires_at, value) under a lock, see app/cache.py
+async def fetch_users_cached(ttl_seconds: int = 60) -> List[Dict]:
+    return await cache.cached_async(USERS_KEY, ttl_seconds, _fetch_users_from_graph)
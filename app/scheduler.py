@@ -1,8 +1,9 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from .snapshot_job import run_snapshot_once
 from datetime import datetime
 
-scheduler = BackgroundScheduler()
+# runs jobs on the API's event loop; start() binds to the loop that is running at startup
+scheduler = AsyncIOScheduler()
 def start_scheduler(interval_minutes: int = 15):
     try:
         scheduler.remove_all_jobs()
@@ -10,4 +11,3 @@ def start_scheduler(interval_minutes: int = 15):
         pass
     scheduler.add_job(run_snapshot_once, "interval", minutes=interval_minutes, id="snapshot_job")
     scheduler.start()
-
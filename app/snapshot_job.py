@@ -1,16 +1,22 @@
 # app/snapshot_job.py
-from sqlmodel import Session
-from .database import get_engine
-from .ms_graph import fetch_managed_devices
-from .summary_utils import summarize_devices
+from .database import SessionLocal
+from .ms_graph import fetch_managed_devices, MANAGED_DEVICES_KEY, MANAGED_DEVICES_TTL_SEC
+from . import cache
+from .summary_utils import summarize_devices_cached
 from .models import DeviceSnapshot
-from datetime import datetime
+import asyncio
 
-def run_snapshot_once():
-    devices = fetch_managed_devices()  # list of device dicts from Graph
-    s = summarize_devices(devices)     # returns aggregated dict
+def _save_snapshot(snap: DeviceSnapshot):
+    # pooled engine + shared session factory, same as the request handlers
+    with SessionLocal() as session:
+        session.add(snap)
+        session.commit()
+
+async def run_snapshot_once():
+    # runs on the API's event loop (AsyncIOScheduler / BackgroundTasks) with the shared Graph client
+    devices = await fetch_managed_devices()  # list of device dicts from Graph
+    s = summarize_devices_cached(devices)     # returns aggregated dict
     snap = DeviceSnapshot(
-        timestamp=datetime.utcnow(),
         total=s["total"],
         corporate=s["corporate"],
         personal=s["personal"],
@@ -20,8 +26,9 @@ def run_snapshot_once():
         by_os_version=s.get("by_os_version", {}),
         raw_sample={"count": min(5, len(devices)), "examples": devices[:5]},
     )
-    engine = get_engine()
-    with Session(engine) as session:
-        session.add(snap)
-        session.commit()
+    # the sync DB write goes to a worker thread so the loop keeps serving requests
+    await asyncio.to_thread(_save_snapshot, snap)
+    # drop stale dashboard reads and reuse the list we just fetched
+    cache.clear()
+    cache.put(MANAGED_DEVICES_KEY, devices, MANAGED_DEVICES_TTL_SEC)
     return snap
\ No newline at end of file
@@ -1,24 +1,37 @@
-from collections import Counter, defaultdict
-from typing import List, Dict
+from collections import Counter, OrderedDict, defaultdict
+from typing import List, Dict, Optional, Tuple
+import threading
+from functools import lru_cache
 
 
+OWNER_FIELDS = ("ownerType", "ownership", "managedDeviceOwnerType")
+# normalized owner values that map straight to a bucket
+COMPANY_VALUES = frozenset({"company", "corporate", "companyowned", "company_owned"})
+PERSONAL_VALUES = frozenset({"personal", "personalowned", "personal_owned", "user"})
+
+@lru_cache(maxsize=1024)
+def _owner_from_value(raw: str) -> Optional[str]:
+    # Graph only returns a handful of distinct owner strings: normalize each one once
+    vv = raw.strip().lower()
+    if vv in COMPANY_VALUES:
+        return "company"
+    if vv in PERSONAL_VALUES:
+        return "personal"
+    # catch values like "company, personal" etc
+    if "company" in vv:
+        return "company"
+    if "personal" in vv or "user" in vv:
+        return "personal"
+    return None
+
 def infer_owner_from_device(d: Dict) -> str:
     # Try canonical owner field first
-    cand_fields = ["ownerType", "ownership", "managedDeviceOwnerType"]
-    for f in cand_fields:
+    for f in OWNER_FIELDS:
         v = d.get(f)
         if v:
-            vv = str(v).strip().lower()
-            # normalize common values
-            if vv in ("company", "corporate", "companyowned", "company_owned"):
-                return "company"
-            if vv in ("personal", "personalowned", "personal_owned", "user"):
-                return "personal"
-            # catch values like "company, personal" etc
-            if "company" in vv:
-                return "company"
-            if "personal" in vv or "user" in vv:
-                return "personal"
+            owner = _owner_from_value(v if type(v) is str else str(v))
+            if owner:
+                return owner
     # fallback heuristics:
     # - if userPrincipalName exists -> likely user-associated (treat as personal)
     # - if managedDeviceOwnerType exists and indicates user -> personal
@@ -31,23 +44,32 @@ def infer_owner_from_device(d: Dict) -> str:
     # default unknown
     return "unknown"
 
+def _summary_key(d: Dict) -> tuple:
+    # only the fields the summary reads; Graph returns scalars so the tuple is hashable
+    return (
+        d.get("ownerType"), d.get("ownership"), d.get("managedDeviceOwnerType"),
+        bool(d.get("userPrincipalName")), d.get("managementAgent"),
+        d.get("complianceState"), d.get("operatingSystem"), d.get("osVersion"),
+    )
+
 def summarize_devices(devices: List[Dict]) -> Dict:
     owners = Counter()
     compliance = Counter()
     os_counter = Counter()
     os_version_counter = Counter()
-    for d in devices:
-        owner = infer_owner_from_device(d)
-        owners[owner] += 1
-
-        state = (d.get("complianceState") or "unknown")
-        compliance[state.lower()] += 1
-
-        os_name = (d.get("operatingSystem") or "unknown").lower()
-        os_counter[os_name] += 1
-
-        os_version = (d.get("osVersion") or "unknown").lower()
-        os_version_counter[f"{os_name} {os_version}"] += 1
+    # one pass over the devices counting distinct field combinations (few of them),
+    # then normalize each combination once instead of once per device
+    combos = Counter(map(_summary_key, devices))
+    for (owner_type, ownership, owner_kind, has_upn, agent, state, os_name, os_version), n in combos.items():
+        owner = infer_owner_from_device({
+            "ownerType": owner_type, "ownership": ownership, "managedDeviceOwnerType": owner_kind,
+            "userPrincipalName": has_upn, "managementAgent": agent,
+        })
+        owners[owner] += n
+        compliance[(state or "unknown").lower()] += n
+        os_name = (os_name or "unknown").lower()
+        os_counter[os_name] += n
+        os_version_counter[f"{os_name} {(os_version or 'unknown').lower()}"] += n
 
     result = {
         "total": len(devices),
@@ -60,4 +82,33 @@ def summarize_devices(devices: List[Dict]) -> Dict:
         "compliant": compliance.get("compliant", 0),
         "noncompliant": compliance.get("noncompliant", 0),
     }
-    return result
\ No newline at end of file
+    return result
+
+def with_top_os(summary: Dict, n: int) -> Dict:
+    """Copy of summary whose by_os keeps only the n most common OS names (the cached summary is shared)."""
+    return {**summary, "by_os": dict(Counter(summary.get("by_os", {})).most_common(n))}
+
+SUMMARY_MEMO_SIZE = 8
+# id(devices) -> (devices, summary); keeping the list referenced stops its id from being reused
+_summary_memo: "OrderedDict[int, Tuple[List[Dict], Dict]]" = OrderedDict()
+_summary_memo_lock = threading.Lock()
+
+def summarize_devices_cached(devices: List[Dict]) -> Dict:
+    """
+    summarize_devices memoized per device-list object (small LRU). The Graph device cache hands
+    the same, never mutated, list to the dashboard and the snapshot job, so each fetch is
+    aggregated once. Callers must not mutate the returned dict.
+    """
+    key = id(devices)
+    with _summary_memo_lock:
+        hit = _summary_memo.get(key)
+        if hit and hit[0] is devices:
+            _summary_memo.move_to_end(key)
+            return hit[1]
+    summary = summarize_devices(devices)
+    with _summary_memo_lock:
+        _summary_memo[key] = (devices, summary)
+        _summary_memo.move_to_end(key)
+        while len(_summary_memo) > SUMMARY_MEMO_SIZE:
+            _summary_memo.popitem(last=False)
+    return summary
@@ -5,13 +5,13 @@ from .ms_graph import fetch_users_cached
 router = APIRouter(prefix="/api", tags=["users"])
 
 @router.get("/users", response_model=List[Dict])
-def list_users(limit: int = 200):
+async def list_users(limit: int = 200):
     """
     Return a list of users from Microsoft Graph (cached).
     Fields: id, displayName, userPrincipalName
     """
     try:
-        users = fetch_users_cached(ttl_seconds=60)
+        users = await fetch_users_cached(ttl_seconds=60)
         if limit:
             return users[:limit]
         return users
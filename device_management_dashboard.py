@@ -4,75 +4,269 @@ Streamlit app with sidebar menu:
 - Inventory Management           -> uses /api/inventory, /api/inventory/licenses, /api/inventory/history, allocation endpoints
 
 Requirements:
-pip install streamlit requests pandas plotly streamlit-autorefresh st-aggrid
+pip install streamlit requests pandas plotly pyarrow st-aggrid
 """
+import io
+import threading
+import time
 import streamlit as st
 import requests
+import orjson
 import pandas as pd
 import plotly.express as px
-from datetime import datetime, timedelta
-from streamlit_autorefresh import st_autorefresh
+from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 API_BASE = st.secrets.get("api_base", "http://localhost:8000/api")
 AUTO_REFRESH_SEC = 60
+CACHE_TTL_SEC = 30
+# per-endpoint freshness: counts move often, pools rarely, history is append-only.
+# Mutations made from this page expire the inventory entries right away (_expire_inventory).
+LICENSES_TTL_SEC = 120
+HISTORY_TTL_SEC = 300
+# (connect, read) seconds for every API call; the summary may page through Graph on a cold cache
+TIMEOUT = (2, 5)
+SUMMARY_TIMEOUT = (2, 30)
+TREND_LIMIT = 200
+# column order of the list endpoints; the frames are built column-wise in this order
+INVENTORY_COLUMNS = ["id", "sku", "name", "item_type", "quantity", "location", "metadata_", "created_at", "updated_at", "version"]
+LICENSE_COLUMNS = ["id", "sku", "display_name", "total", "allocated", "metadata_", "created_at", "updated_at"]
+HISTORY_COLUMNS = ["id", "timestamp", "action", "actor", "details"]
+TREND_COLUMNS = ["timestamp", "total", "noncompliant"]
+# dict-valued columns, serialized to JSON text for file exports
+JSON_COLUMNS = ["metadata_"]
 
 st.set_page_config(page_title="Devices & Inventory", layout="wide")
-st_autorefresh(interval=AUTO_REFRESH_SEC * 1000, key="auto_refresh_dashboard")
 
 # -------------------------
 # Helpers
 # -------------------------
-@st.cache_data(ttl=30)
-def get_summary():
-    r = requests.get(f"{API_BASE}/dashboard/summary", timeout=20)
+@st.cache_resource
+def _http_session():
+    # one keep-alive pool shared by every rerun instead of a new connection per call
+    s = requests.Session()
+    # retries stay short (idempotent GETs only) so a sick backend fails fast instead of hanging the page
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20,
+                          max_retries=Retry(total=2, connect=1, read=1, backoff_factor=0.1, status_forcelist=[502, 503, 504]))
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+@st.cache_resource
+def _fetch_pool():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="api-fetch")
+
+def _parallel_fetch(calls):
+    """Run independent fetches concurrently. Returns {name: Future}, all already finished."""
+    futures = {name: _fetch_pool().submit(fn) for name, fn in calls.items()}
+    wait(futures.values())
+    return futures
+
+def _json(r):
+    # parse the raw bytes: skips requests' bytes -> str decode copy and the stdlib parser
+    return orjson.loads(r.content)
+
+@st.cache_resource
+def _response_cache():
+    # url -> (fetched_at, etag, payload), shared by reruns; no pickling on store/load
+    return {}
+
+def _frame(rows, columns):
+    """DataFrame from a list of JSON objects, accumulated column by column.
+    Keys the server added beyond `columns` are kept, after them."""
+    if rows:
+        columns = columns + [k for k in rows[0] if k not in columns]
+    return pd.DataFrame({c: [r.get(c) for r in rows] for c in columns}, columns=columns)
+
+def _parse_ts(col):
+    # backend timestamps are ISO 8601 in UTC, with or without an offset (SQLite drops it)
+    return pd.to_datetime(col, format="ISO8601", utc=True, cache=True)
+
+def _inventory_frame(rows):
+    df = _frame(rows, INVENTORY_COLUMNS).astype({"quantity": "int32"})
+    df["available"] = df["quantity"]  # you can expand with reserved logic
+    return df
+
+def _license_frame(rows):
+    df = _frame(rows, LICENSE_COLUMNS).astype({"total": "int32", "allocated": "int32"})
+    df["available"] = (df["total"] - df["allocated"]).astype("int32")
+    return df
+
+def _history_frame(rows):
+    return _frame(rows, HISTORY_COLUMNS).assign(timestamp=lambda df: _parse_ts(df["timestamp"]))
+
+def _cached_get_json(url, ttl=CACHE_TTL_SEC, build=None, timeout=TIMEOUT):
+    """GET url as JSON, reusing the stored payload for ttl seconds and revalidating
+    it with If-None-Match afterwards (the backend answers 304 when nothing changed).
+    build(payload), if given, runs once per downloaded body and its result is what gets stored."""
+    cache = _response_cache()
+    hit = cache.get(url)
+    now = time.monotonic()
+    if hit and now - hit[0] < ttl:
+        return hit[2]
+    headers = {"If-None-Match": hit[1]} if hit and hit[1] else None
+    r = _http_session().get(url, headers=headers, timeout=timeout)
+    if r.status_code == 304 and hit:
+        cache[url] = (now, hit[1], hit[2])
+        return hit[2]
     r.raise_for_status()
-    return r.json()
+    payload = _json(r)
+    if build is not None:
+        payload = build(payload)
+    cache[url] = (now, r.headers.get("ETag"), payload)
+    return payload
 
-@st.cache_data(ttl=30)
-def get_latest_snapshot():
-    try:
-        r = requests.get(f"{API_BASE}/dashboard/snapshots?limit=1", timeout=20)
-        r.raise_for_status()
-        arr = r.json()
-        if isinstance(arr, list) and arr:
-            return arr[0]
-    except:
-        return None
-
-@st.cache_data(ttl=30)
+def get_summary(top_os=20):
+    return _cached_get_json(f"{API_BASE}/dashboard/summary?top_os={top_os}", timeout=SUMMARY_TIMEOUT)
+
+# the list getters return shared, cached DataFrames: derive with .assign(), don't mutate
 def get_inventory_items(limit=500):
-    r = requests.get(f"{API_BASE}/inventory?limit={limit}", timeout=20)
-    r.raise_for_status()
-    return r.json()
+    return _cached_get_json(f"{API_BASE}/inventory?limit={limit}", build=_inventory_frame)
 
-@st.cache_data(ttl=30)
 def get_license_pools():
-    r = requests.get(f"{API_BASE}/inventory/licenses", timeout=20)
-    r.raise_for_status()
-    return r.json()
+    return _cached_get_json(f"{API_BASE}/inventory/licenses", ttl=LICENSES_TTL_SEC, build=_license_frame)
+
+def get_history(limit=200, order="timestamp.desc"):
+    return _cached_get_json(f"{API_BASE}/inventory/history?limit={limit}&order={order}", ttl=HISTORY_TTL_SEC, build=_history_frame)
+
+def _expire_inventory():
+    """Mark every cached /inventory response stale after a write. The ETag is kept, so the
+    next read revalidates (304 when this write didn't touch that list) instead of refetching."""
+    cache = _response_cache()
+    for url, (_, etag, payload) in list(cache.items()):
+        if url.startswith(f"{API_BASE}/inventory"):
+            cache[url] = (float("-inf"), etag, payload)
+
+# inventory page data: local name -> (bundle part, frame builder, per-endpoint getter)
+INVENTORY_BUNDLE = {
+    "items": ("items:500", _inventory_frame, lambda: get_inventory_items(limit=500)),
+    "pools": ("licenses", _license_frame, get_license_pools),
+    "history": ("history:500", _history_frame, lambda: get_history(limit=500)),
+}
+# how long each dataset may be reused; a bundle lives as long as its most volatile part
+INVENTORY_TTLS = {"items": CACHE_TTL_SEC, "pools": LICENSES_TTL_SEC, "history": HISTORY_TTL_SEC}
+
+# inventory sections and the datasets each one reads
+INVENTORY_TABS = {
+    "Items": ("items",),
+    "Licenses": ("pools",),
+    "Assign / Return": ("pools", "history"),
+    "History": ("history",),
+    "Reports": ("items",),
+}
+
+def get_inventory_bundle(names=tuple(INVENTORY_BUNDLE)):
+    """The named inventory datasets, in one GET /inventory/bundle round trip.
+    Falls back to the separate endpoints (fetched in parallel) on a backend without /bundle."""
+    wanted = {name: INVENTORY_BUNDLE[name] for name in names}
+    parts = ",".join(part for part, _, _ in wanted.values())
+    build = lambda payload: {name: frame(payload[part]) for name, (part, frame, _) in wanted.items()}
+    try:
+        ttl = min(INVENTORY_TTLS[name] for name in wanted)
+        return _cached_get_json(f"{API_BASE}/inventory/bundle?parts={parts}", ttl=ttl, build=build)
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+    fetched = _parallel_fetch({name: getter for name, (_, _, getter) in wanted.items()})
+    return {name: f.result() for name, f in fetched.items()}
 
-@st.cache_data(ttl=30)
-def get_history(limit=200):
-    r = requests.get(f"{API_BASE}/inventory/history?limit={limit}", timeout=20)
+def get_snapshots(limit=200, since=None):
+    r = _http_session().get(f"{API_BASE}/dashboard/snapshots", params={"limit": limit, "since": since, "include_details": "false"}, timeout=TIMEOUT)
     r.raise_for_status()
-    return r.json()
+    return _json(r)
+
+@st.cache_resource
+def _snapshot_state():
+    # newest-first (id, (timestamp, total, noncompliant)) trend rows plus the newest full row, shared by all sessions
+    return {"lock": threading.Lock(), "checked_at": None, "latest": None, "rows": [], "ids": set(), "points": ()}
+
+def get_dashboard_snapshots():
+    """(latest snapshot or None, trend points newest first) from one incremental call.
+    At most every CACHE_TTL_SEC, rows newer than the held ones are requested (since=) and
+    prepended, keeping the newest TREND_LIMIT; the newest row doubles as the KPI snapshot."""
+    state = _snapshot_state()
+    # one session refreshes at a time: the others wait and then find the state current
+    with state["lock"]:
+        now = time.monotonic()
+        if state["checked_at"] is not None and now - state["checked_at"] < CACHE_TTL_SEC:
+            return state["latest"], state["points"]
+        since = state["rows"][0][1][0] if state["rows"] else None
+        # dedupe by id: a backend without since= answers with the newest TREND_LIMIT rows again
+        new = [s for s in get_snapshots(TREND_LIMIT, since=since) if s["id"] not in state["ids"]]
+        rows = ([(s["id"], (s["timestamp"], s["total"], s["noncompliant"])) for s in new] + state["rows"])[:TREND_LIMIT]
+        state.update(checked_at=now, latest=new[0] if new else state["latest"], rows=rows,
+                     ids={i for i, _ in rows}, points=tuple(p for _, p in rows))
+        return state["latest"], state["points"]
 
 def post_json(path, payload):
-    r = requests.post(f"{API_BASE}{path}", json=payload, timeout=20)
+    r = _http_session().post(f"{API_BASE}{path}", json=payload, timeout=TIMEOUT)
+    if r.ok and path.startswith("/inventory"):
+        _expire_inventory()
     return r
 
+# -------------------------
+# Charts: keyed on the plotted values, so unchanged data skips the figure rebuild
+# -------------------------
+@st.cache_data(ttl=120)
+def _bar_os(top_os):
+    df_os = pd.DataFrame(top_os, columns=["os", "count"])
+    fig = px.bar(df_os, x="os", y="count", color="os", height=360)
+    fig.update_layout(showlegend=False, margin=dict(l=10,r=10,t=30,b=10))
+    return fig
+
+@st.cache_data(ttl=120)
+def _line_trend(points):
+    # only the plotted columns: by_os / raw_sample blobs never become frame cells
+    df_plot = pd.DataFrame(points, columns=TREND_COLUMNS)
+    df_plot = df_plot.astype({"total": "int32", "noncompliant": "int32"})
+    df_plot["timestamp"] = _parse_ts(df_plot["timestamp"])
+    df_plot = df_plot.sort_values("timestamp")
+    return px.line(df_plot, x="timestamp", y=TREND_COLUMNS[1:], markers=True, height=400)
+
+@st.cache_data(ttl=AUTO_REFRESH_SEC)
+def _kpi_html(total, corporate, personal, compliant, noncompliant, last_ts):
+    # the header + KPI row as one HTML block, rebuilt only when a value changes;
+    # last_ts is None when there is no snapshot yet
+    if last_ts:
+        ts = datetime.fromisoformat(last_ts)
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        last_update = ts.isoformat(sep=' ', timespec='seconds')
+    else:
+        last_update = "—"
+    cells = "".join(
+        f"<div class='kpi-cell'><div class='kpi-label'>{label}</div><div class='kpi-value'>{value:,}</div></div>"
+        for label, value in (("Total devices", total), ("Corporate", corporate), ("Personal", personal),
+                             ("Compliant", compliant), ("Non-compliant", noncompliant))
+    )
+    return (
+        "<style>.kpi-row{display:flex;gap:12px;margin:8px 0}.kpi-cell{flex:1}"
+        ".kpi-label{font-size:14px;opacity:.7}.kpi-value{font-size:2.25rem;line-height:1.2}</style>"
+        f"<p>Last update (UTC): <b>{last_update}</b></p>"
+        f"<div class='kpi-row'>{cells}</div>"
+    )
+
 # -------------------------
 # Page: Dashboard (Device Management)
 # -------------------------
 def render_dashboard():
     st.title("Devices Management — Dashboard")
+    _live_dashboard()
+
+# only this fragment reruns on the timer; the rest of the page (and other pages) stay untouched
+@st.fragment(run_every=AUTO_REFRESH_SEC)
+def _live_dashboard():
     # prefer snapshot for last update/time series
-    latest_snapshot = get_latest_snapshot()
-    if latest_snapshot:
-        last_ts = pd.to_datetime(latest_snapshot.get("timestamp"))
-    else:
-        last_ts = datetime.utcnow()
-    st.markdown(f"Last update (UTC): **{last_ts.strftime('%Y-%m-%d %H:%M:%S')}**")
+    try:
+        latest_snapshot, points = get_dashboard_snapshots()
+        snapshot_error = None
+    except (requests.RequestException, ValueError) as e:
+        st.toast(f"snapshot unavailable: {e}")
+        latest_snapshot, points, snapshot_error = None, (), e
+    last_ts = latest_snapshot.get("timestamp") if latest_snapshot else None
 
     # summary KPIs
     if latest_snapshot:
@@ -93,58 +287,65 @@ def render_dashboard():
         owners = summary.get("owners", {})
         by_os = summary.get("by_os", {})
 
-    c1, c2, c3, c4, c5 = st.columns([1.2,1.2,1.2,1.2,1.2])
-    c1.metric("Total devices", f"{total:,}")
-    c2.metric("Corporate", f"{corporate:,}")
-    c3.metric("Personal", f"{personal:,}")
-    c4.metric("Compliant", f"{compliant:,}")
-    c5.metric("Non-compliant", f"{noncompliant:,}")
+    st.markdown(_kpi_html(total, corporate, personal, compliant, noncompliant, last_ts), unsafe_allow_html=True)
 
     st.markdown("---")
     st.subheader("Top OS distribution")
     if by_os:
-        df_os = pd.DataFrame({"os": list(by_os.keys()), "count": list(by_os.values())})
-        df_os = df_os.sort_values("count", ascending=False).head(20)
-        fig = px.bar(df_os, x="os", y="count", color="os", height=360)
-        fig.update_layout(showlegend=False, margin=dict(l=10,r=10,t=30,b=10))
-        st.plotly_chart(fig, use_container_width=True)
+        # the summary arrives trimmed (top_os=20) but snapshots carry every OS: slice either way
+        top_os = tuple(sorted(by_os.items(), key=lambda kv: -kv[1])[:20])
+        st.plotly_chart(_bar_os(top_os), use_container_width=True)
     else:
         st.info("No OS distribution data available.")
 
     # Trend chart if snapshots exist
     st.subheader("Trend (if snapshots available)")
-    try:
-        r = requests.get(f"{API_BASE}/dashboard/snapshots?limit=200", timeout=30)
-        r.raise_for_status()
-        snaps = r.json()
-        if snaps:
-            df = pd.DataFrame(snaps)
-            df["timestamp"] = pd.to_datetime(df["timestamp"])
-            df = df.sort_values("timestamp")
-            cols = ["total", "noncompliant"]
-            df_plot = df[["timestamp"] + [c for c in cols if c in df.columns]]
-            fig2 = px.line(df_plot, x="timestamp", y=cols, markers=True, height=400)
-            st.plotly_chart(fig2, use_container_width=True)
-        else:
-            st.info("Chưa có snapshot lịch sử. Bật scheduler backend để lưu snapshots.")
-    except Exception as e:
-        st.warning("Không thể lấy snapshots: " + str(e))
+    if snapshot_error:
+        st.warning("Không thể lấy snapshots: " + str(snapshot_error))
+    elif points:
+        st.plotly_chart(_line_trend(points), use_container_width=True)
+    else:
+        st.info("Chưa có snapshot lịch sử. Bật scheduler backend để lưu snapshots.")
 
 # -------------------------
 # Page: Inventory Management
 # -------------------------
+@st.cache_data(ttl=CACHE_TTL_SEC)
+def _license_choices(pools):
+    # (id, sku, available) tuples -> selectbox labels, rebuilt only when the pools change
+    return {i: f"{sku} (avail {available})" for i, sku, available in pools}
+
+@st.cache_data(ttl=CACHE_TTL_SEC)
+def _to_parquet(df):
+    # nested JSON goes out as text: parquet can't hold the empty {} structs metadata_ often is
+    df = df.assign(**{c: df[c].map(lambda v: orjson.dumps(v).decode()) for c in JSON_COLUMNS if c in df})
+    buf = io.BytesIO()
+    df.to_parquet(buf, engine="pyarrow", compression="snappy", index=False)
+    return buf.getvalue()
+
+@st.cache_data(ttl=CACHE_TTL_SEC)
+def _to_csv(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+def _grid(df, key):
+    # virtualized, paginated grid; no update events, so sorting/filtering/paging stays in the browser
+    gb = GridOptionsBuilder.from_dataframe(df)
+    gb.configure_default_column(sortable=True, filter=True, resizable=True)
+    gb.configure_pagination(paginationAutoPageSize=True)
+    AgGrid(df, gridOptions=gb.build(), update_mode=GridUpdateMode.NO_UPDATE, update_on=[],
+           theme="streamlit", height=500, key=key)
+
 def render_inventory():
     st.title("Inventory Management")
-    tabs = st.tabs(["Items", "Licenses", "Assign / Return", "History", "Reports"])
+    active = st.radio("Section", list(INVENTORY_TABS), horizontal=True, key="active_tab", label_visibility="collapsed")
+    # only the selected section fetches its data and renders (st.tabs would run every body)
+    fetched = get_inventory_bundle(INVENTORY_TABS[active])
+    items, pools, history = fetched.get("items"), fetched.get("pools"), fetched.get("history")
     # Items tab
-    with tabs[0]:
+    if active == "Items":
         st.subheader("Inventory items")
-        items = get_inventory_items()
-        if items:
-            df = pd.DataFrame(items)
-            if "quantity" in df.columns:
-                df["available"] = df["quantity"]  # you can expand with reserved logic
-            st.dataframe(df)
+        if not items.empty:
+            _grid(items, key="items_grid")
         else:
             st.info("No inventory items found.")
 
@@ -165,7 +366,7 @@ def render_inventory():
                         "location": location,
                         "metadata_": {"notes": notes},
                     }
-                    r = requests.post(f"{API_BASE}/inventory", json=payload, timeout=20)
+                    r = post_json("/inventory", payload)
                     if r.status_code in (200,201):
                         st.success("Item created")
                         try:
@@ -177,13 +378,10 @@ def render_inventory():
                         st.error(f"Create failed: {r.status_code} {r.text}")
 
     # Licenses tab
-    with tabs[1]:
+    if active == "Licenses":
         st.subheader("License pools")
-        pools = get_license_pools()
-        if pools:
-            dfp = pd.DataFrame(pools)
-            dfp["available"] = dfp["total"] - dfp["allocated"]
-            st.dataframe(dfp)
+        if not pools.empty:
+            st.dataframe(pools)
         else:
             st.info("No license pools.")
 
@@ -194,7 +392,7 @@ def render_inventory():
                 total = st.number_input("Total count", min_value=0, value=0)
                 if st.form_submit_button("Create license pool"):
                     payload = {"sku": sku, "display_name": display, "total": int(total)}
-                    r = requests.post(f"{API_BASE}/inventory/licenses", json=payload, timeout=20)
+                    r = post_json("/inventory/licenses", payload)
                     if r.status_code in (200,201):
                         st.success("License pool created")
                         try:
@@ -206,20 +404,19 @@ def render_inventory():
                         st.error(f"Error: {r.status_code} {r.text}")
 
     # Assign / Return tab
-    with tabs[2]:
+    if active == "Assign / Return":
         st.subheader("Allocate license to user/device")
-        pools = get_license_pools()
-        if not pools:
+        if pools.empty:
             st.info("No licenses. Create a license pool first.")
         else:
-            choices = {p["id"]: f'{p["sku"]} (avail {p["total"]-p["allocated"]})' for p in pools}
-            license_id = st.selectbox("License pool", options=list(choices.keys()), format_func=lambda k: choices[k])
+            choices = _license_choices(tuple(zip(pools["id"].tolist(), pools["sku"].tolist(), pools["available"].tolist())))
+            license_id = st.selectbox("License pool", options=list(choices), format_func=choices.__getitem__)
             user_upn = st.text_input("User UPN (e.g. user@company.com)")
             device_graph_id = st.text_input("Device Graph ID (optional)")
             actor = st.text_input("Your name / actor", value="admin")
             if st.button("Allocate"):
                 payload = {"user_upn": user_upn, "device_graph_id": device_graph_id, "actor": actor}
-                r = requests.post(f"{API_BASE}/inventory/licenses/{license_id}/allocate", json=payload, timeout=20)
+                r = post_json(f"/inventory/licenses/{license_id}/allocate", payload)
                 if r.status_code == 200:
                     st.success("Allocated")
                 else:
@@ -227,16 +424,15 @@ def render_inventory():
 
         st.markdown("---")
         st.subheader("Return / Revoke assignment")
-        hist = get_history(limit=200)
-        dfhist = pd.DataFrame(hist)
-        if not dfhist.empty:
+        if not history.empty:
             # show recent allocations from history or assignments endpoint if available
-            st.dataframe(dfhist.head(50))
+            # (the History tab's rows: no separate fetch)
+            st.dataframe(history.head(50))
             with st.form("return_form"):
                 assignment_id = st.number_input("Assignment ID to return", min_value=0, value=0)
                 actor_r = st.text_input("Your name", value="admin")
                 if st.form_submit_button("Return"):
-                    r = requests.post(f"{API_BASE}/inventory/assignments/{assignment_id}/return", json={"actor": actor_r}, timeout=20)
+                    r = post_json(f"/inventory/assignments/{assignment_id}/return", {"actor": actor_r})
                     if r.status_code == 200:
                         st.success("Returned")
                     else:
@@ -245,24 +441,23 @@ def render_inventory():
             st.info("No history available to return.")
 
     # History tab
-    with tabs[3]:
+    if active == "History":
         st.subheader("Inventory history / audit")
-        history = get_history(limit=500)
-        if history:
-            dfh = pd.DataFrame(history)
-            dfh["timestamp"] = pd.to_datetime(dfh["timestamp"])
-            st.dataframe(dfh.sort_values("timestamp", ascending=False))
+        if not history.empty:
+            # the API already returns newest first
+            _grid(history, key="history_grid")
         else:
             st.info("No history records.")
 
     # Reports tab
-    with tabs[4]:
+    if active == "Reports":
         st.subheader("Reports & exports")
-        items = get_inventory_items()
-        if items:
-            df = pd.DataFrame(items)
-            csv = df.to_csv(index=False).encode("utf-8")
-            st.download_button("Download inventory CSV", data=csv, file_name="inventory.csv", mime="text/csv")
+        if not items.empty:
+            # callables: encoded only when clicked (cached per frame), not on every rerun
+            st.download_button("Download inventory (Parquet)", data=lambda: _to_parquet(items),
+                               file_name="inventory.parquet", mime="application/octet-stream", on_click="ignore")
+            st.download_button("Download inventory CSV", data=lambda: _to_csv(items),
+                               file_name="inventory.csv", mime="text/csv", on_click="ignore")
         else:
             st.info("No data to export.")
 
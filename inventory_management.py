@@ -1,31 +1,77 @@
 import streamlit as st
 import requests
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from typing import Optional
-import plotly.express as px
-from datetime import datetime
-from streamlit_autorefresh import st_autorefresh
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from st_aggrid import AgGrid, GridOptionsBuilder, DataReturnMode, GridUpdateMode, JsCode
-import re
+import gzip
+import io
+import threading
+import time
 import html as _html
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Config
 API_BASE = st.secrets.get("api_base", "http://localhost:8000/api")
 API_KEY = st.secrets.get("api_key")  # optional
-AUTO_REFRESH_SEC = 60
+# cache lifetimes follow how often each source really changes; the Refresh buttons clear them on demand
+INVENTORY_TTL_SEC = 300
+LICENSES_TTL_SEC = 600
+HISTORY_TTL_SEC = 120
+HISTORY_LIMIT = 500  # one history fetch, shared by the Assign / Return and History tabs
+INTUNE_TTL_SEC = 120
+CHANGE_POLL_SEC = 5  # how often an open page checks the server change version
+CHANGE_POLL_MAX_SEC = 300  # unattended pages back off up to this interval
+# the only Intune device fields the Devices In Use tab shows
+INTUNE_DEVICE_FIELDS = "id,deviceName,serialNumber,userPrincipalName,createdDateTime,model,operatingSystem"
 LOW_STOCK_THRESHOLD = 3  # UI highlight for low stock
+# (connect, read) timeouts: an unreachable API fails in ~3 s, read timeouts stay per call
+CONNECT_TIMEOUT_SEC = 3.05
+IN_USE_PAGE_SIZE = 100  # rows handed to the Devices In Use grid per rerun
+AGGRID_MIN_ROWS = 25  # below this a plain st.dataframe is cheaper than AgGrid
+# CSV import is posted in batches of this many rows, with at most this many requests in flight
+IMPORT_CHUNK_ROWS = 500
+IMPORT_MAX_IN_FLIGHT = 4
+EXPORT_PAGE_SIZE = 1000  # the export reads the inventory in keyset pages of this many rows
+SUBMIT_DEBOUNCE_SEC = 2.0  # a repeat submit of the same form within this window is dropped
+ETAG_STORE_MAX_ENTRIES = 64  # conditional-GET bodies kept for revalidation
+
+# built once from the secrets read above and mounted on the session; no Content-Type here:
+# the write helpers send it with their bodies, and GETs carry none
+_AUTH_HEADERS = {"Authorization": f"Bearer {API_KEY}"} if API_KEY else {}
+
+# One keep-alive pool for every API call instead of a new TCP/TLS handshake per request
+_SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=50, pool_maxsize=50, max_retries=Retry(total=3, backoff_factor=0.2))
+_SESSION.mount("http://", _adapter)
+_SESSION.mount("https://", _adapter)
+_SESSION.headers.update(_AUTH_HEADERS)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _probe_api():
+    """Connection check for the sidebar: True/False for the HTTP status, None when unreachable.
+    Cached so the probe isn't a blocking round-trip on every rerun."""
+    try:
+        return _SESSION.get(f"{API_BASE.replace('/api', '')}/docs", timeout=2).ok
+    except requests.RequestException:
+        return None
 
 # Display API connection info in sidebar for debugging
 with st.sidebar:
     st.caption(f"🔗 API: {API_BASE}")
-    # Test connection
-    try:
-        test_response = requests.get(f"{API_BASE.replace('/api', '')}/docs", timeout=2)
-        if test_response.ok:
-            st.caption("✅ Connected")
-        else:
-            st.caption("⚠️ API responding with errors")
-    except:
+    api_ok = _probe_api()
+    if api_ok:
+        st.caption("✅ Connected")
+    elif api_ok is False:
+        st.caption("⚠️ API responding with errors")
+    else:
         st.caption("❌ Cannot connect to API")
 
 st.set_page_config(page_title="Devices & Inventory", layout="wide")
@@ -86,26 +132,19 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-st_autorefresh(interval=AUTO_REFRESH_SEC * 1000, key="auto_refresh_inventory")
-
 # ---------- Helpers (API wrappers) ----------
-def _headers():
-    h = {"Content-Type": "application/json"}
-    if API_KEY:
-        h["Authorization"] = f"Bearer {API_KEY}"
-    return h
+def _json(r):
+    # parse the raw bytes: skips requests' bytes -> str decode copy and the stdlib parser
+    return orjson.loads(r.content)
 
-# Compatibility helpers for different Streamlit versions
-def safe_clear_cache():
-    try:
-        if hasattr(st, "cache_data") and hasattr(st.cache_data, "clear"):
-            st.cache_data.clear()
-        elif hasattr(st, "experimental_memo") and hasattr(st.experimental_memo, "clear"):
-            st.experimental_memo.clear()
-    except Exception:
-        pass
+_JSON_HEADERS = {"Content-Type": "application/json"}
 
+def _body(payload):
+    # orjson instead of requests' stdlib encoder: faster on bulk payloads, numpy scalars
+    # and datetimes pass through, and NaN (empty CSV cells) goes out as null
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
 
+# Compatibility helpers for different Streamlit versions
 def safe_rerun():
     try:
         if hasattr(st, "experimental_rerun"):
@@ -115,20 +154,51 @@ def safe_rerun():
     except Exception:
         pass
 
+@st.cache_resource
+def _etag_store():
+    # (path, params) -> (etag, payload) of the last 200, for If-None-Match revalidation;
+    # least recently used first, at most ETAG_STORE_MAX_ENTRIES (shared by every session)
+    return OrderedDict(), threading.Lock()
+
+def _etag_lookup(key):
+    store, lock = _etag_store()
+    with lock:
+        if key in store:
+            store.move_to_end(key)
+        return store.get(key)
+
+def _etag_remember(key, etag, payload):
+    store, lock = _etag_store()
+    with lock:
+        store[key] = (etag, payload)
+        store.move_to_end(key)
+        while len(store) > ETAG_STORE_MAX_ENTRIES:
+            store.popitem(last=False)
+
 def api_get(path, params=None, timeout=20):
+    # once a cached getter expires, the refetch is conditional: an unchanged body comes back as an empty 304;
+    # keyset pages (after_id) are read once per export, so they are never stored
+    key = None if params and "after_id" in params else (path, tuple(sorted((params or {}).items())))
+    stored = _etag_lookup(key) if key else None
+    headers = {"If-None-Match": stored[0]} if stored else None
     try:
-        r = requests.get(f"{API_BASE}{path}", params=params, headers=_headers(), timeout=timeout)
+        r = _SESSION.get(f"{API_BASE}{path}", params=params, headers=headers, timeout=(CONNECT_TIMEOUT_SEC, timeout))
+        if r.status_code == 304 and stored:
+            return stored[1]
         r.raise_for_status()
-        return r.json()
+        payload = _json(r)
+        if key and (etag := r.headers.get("ETag")):
+            _etag_remember(key, etag, payload)
+        return payload
     except Exception as e:
         st.error(f"GET {path} failed: {e}")
         return None
 
 def api_post(path, payload, timeout=30):
     try:
-        r = requests.post(f"{API_BASE}{path}", json=payload, headers=_headers(), timeout=timeout)
+        r = _SESSION.post(f"{API_BASE}{path}", data=_body(payload), headers=_JSON_HEADERS, timeout=(CONNECT_TIMEOUT_SEC, timeout))
         r.raise_for_status()
-        return r.json()
+        return _json(r)
     except requests.HTTPError as he:
         try:
             st.error(f"Error: {r.status_code} - {r.text}")
@@ -141,9 +211,9 @@ def api_post(path, payload, timeout=30):
 
 def api_patch(path, payload, timeout=20):
     try:
-        r = requests.patch(f"{API_BASE}{path}", json=payload, headers=_headers(), timeout=timeout)
+        r = _SESSION.patch(f"{API_BASE}{path}", data=_body(payload), headers=_JSON_HEADERS, timeout=(CONNECT_TIMEOUT_SEC, timeout))
         r.raise_for_status()
-        return r.json()
+        return _json(r)
     except Exception as e:
         st.error(f"PATCH {path} failed: {e}")
         return None
@@ -151,7 +221,7 @@ def api_patch(path, payload, timeout=20):
 def api_post_raw(path, payload, timeout=30):
     # return Response for status checks
     try:
-        r = requests.post(f"{API_BASE}{path}", json=payload, headers=_headers(), timeout=timeout)
+        r = _SESSION.post(f"{API_BASE}{path}", data=_body(payload), headers=_JSON_HEADERS, timeout=(CONNECT_TIMEOUT_SEC, timeout))
         return r
     except requests.exceptions.Timeout:
         st.error(f"⏱️ Request timeout: {path} took longer than {timeout}s")
@@ -164,31 +234,37 @@ def api_post_raw(path, payload, timeout=30):
         return None
 
 # ---------- Cached GETs ----------
-@st.cache_data(ttl=30)
+@st.cache_data(ttl=INVENTORY_TTL_SEC)
 def get_inventory_items(limit=500, offset=0):
     params = {"limit": limit, "offset": offset}
     return api_get("/inventory", params=params) or []
 
-@st.cache_data(ttl=30)
+@st.cache_data(ttl=INVENTORY_TTL_SEC)
+def get_inventory_stats(threshold=LOW_STOCK_THRESHOLD):
+    # three aggregates computed server-side instead of downloading every item
+    return api_get("/inventory/stats", params={"threshold": threshold}) or {}
+
+@st.cache_data(ttl=LICENSES_TTL_SEC)
 def get_license_pools():
     return api_get("/inventory/licenses") or []
 
-@st.cache_data(ttl=30)
-def get_history(limit=500):
-    return api_get("/inventory/history", params={"limit": limit}) or []
+@st.cache_data(ttl=HISTORY_TTL_SEC)
+def get_history(limit=500, order="timestamp.desc"):
+    # the server sorts (newest first by default), the client never re-sorts
+    return api_get("/inventory/history", params={"limit": limit, "order": order}) or []
 
 
-@st.cache_data(ttl=15)
+@st.cache_data(ttl=INTUNE_TTL_SEC)
 def get_devices_in_use():
     """Fetch devices directly from Intune via Graph API"""
-    result = api_get("/intune/devices")
+    result = api_get("/intune/devices", params={"fields": INTUNE_DEVICE_FIELDS})
     if result and isinstance(result, dict) and "error" in result:
         st.warning(f"Intune API Error: {result.get('error')}")
         return []
     return result or []
 
 
-@st.cache_data(ttl=15)
+@st.cache_data(ttl=INVENTORY_TTL_SEC)
 def get_devices_in_stock():
     return api_get("/inventory/devices/in_stock") or []
 
@@ -207,8 +283,513 @@ def api_unassign_by_item(item_id: int, actor: str = "ui_user"):
 def get_users(limit: int = 200):
     return api_get("/users", params={"limit": limit}) or []
 
+@st.cache_data(ttl=60)
+def get_user_options(limit: int = 200):
+    """(upns, labels) for the user pickers: the UPN list and {upn: "Display name (upn)"}."""
+    labels = {}
+    for u in get_users(limit=limit):
+        upn = u.get("userPrincipalName")
+        labels[upn] = f"{u.get('displayName') or upn} ({upn})"
+    return list(labels), labels
+
+# status labels (category codes) indexed by _stock_level: out (<= 0), low (<= LOW_STOCK_THRESHOLD), ok
+_ITEM_STATUS_LABELS = np.array(["out", "low", "ok"])
+_LICENSE_STATUS_LABELS = np.array(["❌ Out", "⚠️ Low", "✅ Avail"])
+
+def _stock_level(avail):
+    """0/1/2 per row (out/low/ok) from two branchless comparisons; used as the status category codes."""
+    return (avail > 0).astype(np.int8) + (avail > LOW_STOCK_THRESHOLD)
+
+# InventoryItem columns as the API returns them; explicit dtypes skip inference on the hot numeric
+# columns, and the low-cardinality text columns are stored as categories
+ITEM_COLUMNS = ["id", "sku", "name", "item_type", "quantity", "location", "metadata_", "created_at", "updated_at", "version"]
+ITEM_DTYPES = {"id": "int64", "quantity": "int32", "version": "int32", "item_type": "category", "location": "category"}
+
+def _items_df(items):
+    return pd.DataFrame.from_records(items, columns=ITEM_COLUMNS, coerce_float=False).astype(ITEM_DTYPES)
+
+# DataFrames for the tables, memoized per getter arguments: reruns reuse the built
+# frame (derived columns included) instead of rebuilding it from the row dicts
+@st.cache_data(ttl=INVENTORY_TTL_SEC, max_entries=8)
+def get_items_frame(limit=500):
+    items = get_inventory_items(limit=limit)
+    if not items:
+        return pd.DataFrame()
+    df = _items_df(items)
+    avail = df["quantity"].to_numpy()
+    df["available"] = avail
+    # the stock level is already the category code: no per-row label strings
+    df["status"] = pd.Categorical.from_codes(_stock_level(avail), categories=_ITEM_STATUS_LABELS)
+    return df
+
+@st.cache_data(ttl=LICENSES_TTL_SEC, max_entries=8)
+def get_license_frame():
+    dfp = pd.DataFrame(get_license_pools())
+    if dfp.empty:
+        return dfp
+    dfp = dfp.astype({"total": "int32", "allocated": "int32"})
+    avail = dfp["total"].to_numpy() - dfp["allocated"].to_numpy()
+    dfp["available"] = avail
+    dfp["status"] = pd.Categorical.from_codes(_stock_level(avail), categories=_LICENSE_STATUS_LABELS)
+    return dfp
+
+@st.cache_data(ttl=LICENSES_TTL_SEC)
+def get_license_choices():
+    """{pool id: "SKU (avail N)"} for the allocate picker, from the frame's availability column."""
+    dfp = get_license_frame()
+    if dfp.empty:
+        return {}
+    labels = dfp["sku"] + " (avail " + dfp["available"].astype(str) + ")"
+    return dict(zip(dfp["id"].tolist(), labels.tolist()))
+
+@st.cache_data(ttl=HISTORY_TTL_SEC, max_entries=8)
+def get_history_frame(limit=500, order="timestamp.desc"):
+    dfh = pd.DataFrame(get_history(limit=limit, order=order))
+    if "timestamp" in dfh.columns:
+        # the API sends ISO 8601: a fixed format skips per-row format inference
+        dfh["timestamp"] = pd.to_datetime(dfh["timestamp"], format="ISO8601")
+    return dfh
+
+def iter_inventory_pages(page_size=EXPORT_PAGE_SIZE, limit=None):
+    """Yield the inventory page by page, keyed on the last id seen (after_id) rather than an offset."""
+    after_id, fetched = None, 0
+    while limit is None or fetched < limit:
+        size = page_size if limit is None else min(page_size, limit - fetched)
+        params = {"limit": size} if after_id is None else {"limit": size, "after_id": after_id}
+        page = api_get("/inventory", params=params) or []
+        if page:
+            yield page
+        if len(page) < size:
+            return
+        after_id, fetched = page[-1]["id"], fetched + len(page)
+
+@st.cache_data(ttl=INVENTORY_TTL_SEC, max_entries=2)
+def get_export_csv_gz(limit=10000):
+    """Gzipped CSV of the inventory for the download button; None when there is nothing to export.
+    Each page is appended to the gzip stream as it arrives, so only one page is held as rows;
+    the result is cached, so reruns don't re-serialize it."""
+    buf = io.BytesIO()
+    rows = 0
+    with gzip.GzipFile(fileobj=buf, mode="wb") as gz:
+        for page in iter_inventory_pages(limit=limit):
+            _items_df(page).to_csv(gz, index=False, header=rows == 0)
+            rows += len(page)
+    return buf.getvalue() if rows else None
+
+# cache groups cleared together: a mutation clears only the groups it changes
+_CACHED_GETTERS = {
+    "inventory": (get_inventory_items, get_inventory_stats, get_items_frame, get_export_csv_gz),
+    "licenses": (get_license_pools, get_license_frame, get_license_choices),
+    "stock": (get_devices_in_stock,),
+    "in_use": (get_devices_in_use,),
+    "history": (get_history, get_history_frame),
+    "users": (get_users, get_user_options),
+}
+
+# session_state lists of rows this session created that a group's cached list may not show yet
+# (see _with_optimistic); clearing the group drops them, the refetch is authoritative
+_OPTIMISTIC_ROWS = {"stock": "stock_optimistic"}
+
+def clear_caches(*keys):
+    for key in keys:
+        for getter in _CACHED_GETTERS[key]:
+            getter.clear()
+        if key in _OPTIMISTIC_ROWS:
+            st.session_state.pop(_OPTIMISTIC_ROWS[key], None)
+
+@st.cache_data(ttl=CHANGE_POLL_SEC, show_spinner=False)
+def get_change_version():
+    return (api_get("/inventory/version", timeout=5) or {}).get("version")
+
+@st.cache_resource
+def _seen_version():
+    return {"version": None}
+
+def _invalidate_on_change():
+    """Clear the inventory-side caches once the server's change version moves, whichever
+    session (or API client) made the change. Caches are shared by all sessions, so the
+    first session to notice refreshes everyone; unchanged data keeps its cache until TTL."""
+    version = get_change_version()
+    seen = _seen_version()
+    if version is None or version == seen["version"]:
+        return version
+    if seen["version"] is not None:
+        clear_caches("inventory", "licenses", "stock", "history")
+    seen["version"] = version
+    return version
+
+def _reset_change_poll():
+    """Back to the base poll interval; called on every full render (user interaction or a change)."""
+    st.session_state["change_poll_sec"] = CHANGE_POLL_SEC
+    st.session_state["change_poll_at"] = time.monotonic() + CHANGE_POLL_SEC
+
+# instead of a timer rerunning the whole page, only this empty fragment runs on the timer and
+# a full rerun happens only when the data actually changed. Each check that finds no change
+# doubles the wait before the next one (up to CHANGE_POLL_MAX_SEC), so idle tabs stop polling
+# the API every CHANGE_POLL_SEC; ticks before the next check are a session_state read
+@st.fragment(run_every=CHANGE_POLL_SEC)
+def _watch_changes():
+    if time.monotonic() < st.session_state.get("change_poll_at", 0.0):
+        return
+    version = _invalidate_on_change()
+    if version is not None and version != st.session_state.get("inventory_version"):
+        st.rerun()
+    interval = min(st.session_state.get("change_poll_sec", CHANGE_POLL_SEC) * 2, CHANGE_POLL_MAX_SEC)
+    st.session_state["change_poll_sec"] = interval
+    st.session_state["change_poll_at"] = time.monotonic() + interval
+
+@st.cache_resource
+def _fetch_pool():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="inventory-fetch")
+
+def _parallel_fetch(calls):
+    """Run independent cached getters concurrently. Returns {name: result}.
+    Workers borrow the script context so st.cache_data and st.error behave as on the main thread."""
+    ctx = get_script_run_ctx()
+
+    def run(fn):
+        add_script_run_ctx(ctx=ctx)
+        return fn()
+
+    futures = {name: _fetch_pool().submit(run, fn) for name, fn in calls.items()}
+    wait(futures.values())
+    return {name: f.result() for name, f in futures.items()}
+
+def _import_batches(batches, progress, done_fraction):
+    """Post record batches to /inventory/bulk_import, at most IMPORT_MAX_IN_FLIGHT at a time.
+    done_fraction(n) gives the progress after n finished batches. Returns (imported, failed);
+    failed holds (error, records) for each batch the server rejected, so it can be resent."""
+    ctx = get_script_run_ctx()
+
+    def post(records):
+        add_script_run_ctx(ctx=ctx)
+        return api_post_raw("/inventory/bulk_import", {"items": records}, timeout=60), records
+
+    imported, failed, pending, finished = 0, [], set(), 0
+
+    def collect(done):
+        nonlocal imported, finished
+        for f in done:
+            r, records = f.result()
+            if r is not None and r.status_code in (200, 201):
+                imported += _json(r).get("imported", 0)
+            else:
+                failed.append((f"{r.status_code} {r.text}" if r is not None else "request failed", records))
+            finished += 1
+        progress.progress(min(done_fraction(finished), 1.0), text=f"Imported {imported} records")
+
+    for records in batches:
+        if len(pending) >= IMPORT_MAX_IN_FLIGHT:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+        pending.add(_fetch_pool().submit(post, records))
+    collect(wait(pending).done)
+    return imported, failed
+
+# text fields of an imported item: read as strings even when every value looks numeric
+# (SKUs like 10023), the server rejects ints there
+IMPORT_TEXT_COLUMNS = {"sku": pa.string(), "name": pa.string(), "item_type": pa.string(), "location": pa.string()}
+
+def _read_csv(uploaded):
+    """Parse an uploaded CSV with Arrow's multi-threaded reader; empty cells become nulls as with pandas."""
+    options = pacsv.ConvertOptions(strings_can_be_null=True, column_types=IMPORT_TEXT_COLUMNS)
+    return pacsv.read_csv(uploaded, convert_options=options)
+
+def _import_csv(table, progress):
+    """Send an Arrow table (see _read_csv) to /inventory/bulk_import in IMPORT_CHUNK_ROWS batches.
+    Each batch is turned into records only when it is sent."""
+    batches = table.to_batches(max_chunksize=IMPORT_CHUNK_ROWS)
+    return _import_batches((b.to_pylist() for b in batches), progress, lambda n: n / max(len(batches), 1))
+
+def _report_import(imported, failed):
+    if imported:
+        clear_caches("inventory", "history")
+    # each batch is all-or-nothing on the server: keep the rejected ones for a retry
+    st.session_state["import_failed"] = [records for _, records in failed]
+    if failed:
+        st.error(f"Imported {imported} records; {len(failed)} batch(es) failed: {failed[0][0]}")
+    else:
+        st.success(f"Imported {imported} records")
+        safe_rerun()
+
+# Status badge for device grids (blue in stock, green in use, grey retired); built once at import.
+# Accepts both the API values ("in_use") and display labels ("In Use").
+_STATUS_CELL_RENDERER = JsCode("""
+    function(params) {
+        const status = String(params.value).toLowerCase().replace(' ', '_');
+        const badge = (color, label) => '<span style="display: inline-block; padding: 4px 12px; border-radius: 12px; background-color: ' + color + '; color: white; font-weight: 600; font-size: 12px;">' + label + '</span>';
+        if (status === 'in_stock') {
+            return badge('#3b82f6', 'In Stock');
+        } else if (status === 'in_use') {
+            return badge('#10b981', 'In Use');
+        } else if (status === 'retired') {
+            return badge('#6b7280', 'Retired');
+        }
+        return params.value;
+    }
+""")
+
+# Items status column: a class toggle per cell (styled by _ITEM_STATUS_CSS inside the grid iframe)
+# instead of assembling an HTML snippet per row
+_ITEM_STATUS_CLASS_RULES = {
+    "cell-low": JsCode("function(params) { return params.value === 'low'; }"),
+    "cell-out": JsCode("function(params) { return params.value === 'out'; }"),
+    "cell-ok": JsCode("function(params) { return params.value === 'ok'; }"),
+}
+_ITEM_STATUS_CSS = {
+    ".cell-low": {"color": "#d97706 !important", "font-weight": "600", "text-transform": "uppercase"},
+    ".cell-out": {"color": "#d62728 !important", "font-weight": "600", "text-transform": "uppercase"},
+    ".cell-ok": {"color": "#2ca02c !important", "font-weight": "600", "text-transform": "uppercase"},
+}
+
+# alias -> canonical column name for the Devices In Use table
+_IN_USE_ALIASES = {
+    "device_name": "deviceName",
+    "name": "deviceName",
+    "serial_number": "serialNumber",
+    "serial": "serialNumber",
+    "user_upn": "userPrincipalName",
+    "assigned_to": "userPrincipalName",
+    "created_at": "createdDateTime",
+    "os": "operatingSystem",
+}
+_IN_USE_COLUMNS = ["status", "deviceName", "serialNumber", "userPrincipalName", "createdDateTime", "model", "operatingSystem"]
+
+# Devices In Stock: server -> display names, defaults for missing columns, display order
+_STOCK_ALIASES = {"asset_tag": "assetCode", "serial": "serialNumber"}
+_STOCK_DEFAULTS = {"assetCode": "", "device_type": "Laptop", "status": "in_stock"}
+_STOCK_FINAL_COLS = [
+    "status", "assetCode", "device_type", "model", "serialNumber", "company", "os", "location",
+    "assigned_to_upn", "assigned_to_id", "device_graph_id", "notes", "created_at", "updated_at",
+    "id", "item_id", "metadata_",
+]
+
+def _with_optimistic(rows, key):
+    """rows plus the rows this session created (session_state[key]) that the cached list
+    doesn't contain yet; a pending row is dropped once the server list includes its id,
+    or when clear_caches clears the list's group."""
+    pending = st.session_state.get(key)
+    if not pending:
+        return rows
+    seen = {r.get("id") for r in rows}
+    pending = [r for r in pending if r.get("id") not in seen]
+    st.session_state[key] = pending
+    return rows + pending
+
+def _selected_rows(grid):
+    """Selected rows of an AgGrid response as a list of dicts.
+    selected_rows is a DataFrame or a list depending on the st_aggrid version."""
+    rows = grid.get("selected_rows")
+    if rows is None:
+        return []
+    if isinstance(rows, pd.DataFrame):
+        return rows.to_dict("records")
+    return list(rows)
+
+def _first_selected(grid):
+    """First selected row of an AgGrid response as a dict, or None."""
+    rows = _selected_rows(grid)
+    return rows[0] if rows else None
+
+def _bulk_delete(path, ids, what):
+    """POST ids to a bulk_delete endpoint: one request and one cache clear + rerun for the whole selection."""
+    r = api_post_raw(path, {"ids": ids, "actor": "ui_user"})
+    if r is None:
+        return
+    if r.ok:
+        st.success(f"✅ Deleted {len(_json(r)['deleted'])} {what}")
+        clear_caches("inventory", "stock", "history")
+        st.rerun()
+    else:
+        st.error(f"❌ Delete failed: {r.status_code} - {r.text}")
+
+def _debounced(form_key):
+    """True when form_key was already submitted in this session less than SUBMIT_DEBOUNCE_SEC ago.
+    A double click queues a second submit, which would run against whatever the form shows
+    after the first one's rerun (e.g. the next device in the list)."""
+    now = time.monotonic()
+    last = st.session_state.get(f"submitted_at_{form_key}", 0.0)
+    st.session_state[f"submitted_at_{form_key}"] = now
+    return now - last < SUBMIT_DEBOUNCE_SEC
+
+def _queue_assign(item_id, user_upn, device_graph_id, actor):
+    """Add an assignment to this session's batch (one per item: re-queuing an item replaces it)."""
+    pending = st.session_state.setdefault("pending_assigns", {})
+    pending[item_id] = {"item_id": item_id, "user_upn": user_upn, "device_graph_id": device_graph_id}
+    st.session_state["pending_assigns_actor"] = actor
+
+def _pending_assigns_panel():
+    """Queued assignments and the button that sends them as one /inventory/assign/bulk request."""
+    pending = st.session_state.get("pending_assigns")
+    if not pending:
+        return
+    st.markdown(f"#### 📦 Queued assignments ({len(pending)})")
+    st.dataframe(pd.DataFrame(list(pending.values())), hide_index=True)
+    col_flush, col_drop = st.columns(2)
+    if col_flush.button(f"🚀 Assign {len(pending)} queued device(s)", use_container_width=True) and not _debounced("flush_assigns"):
+        payload = {"items": list(pending.values()), "actor": st.session_state.get("pending_assigns_actor", "ui_user")}
+        with st.spinner("Assigning devices..."):
+            r = api_post_raw("/inventory/assign/bulk", payload, timeout=60)
+        if r is not None and r.status_code in (200, 201):
+            st.session_state["pending_assigns"] = {}
+            clear_caches("inventory", "stock", "in_use", "history")
+            st.rerun()
+        elif r is not None:
+            # all or nothing on the server: the queue is kept so it can be fixed and resent
+            st.error(f"❌ Bulk assignment failed: {r.status_code} {r.text}")
+    if col_drop.button("Clear queue", use_container_width=True):
+        st.session_state["pending_assigns"] = {}
+        st.rerun()
+
+def _row_by_id(df, row_id, id_col="id"):
+    """The row of df whose id_col equals row_id, as a dict, or None."""
+    if row_id is None or id_col not in df.columns:
+        return None
+    match = df[df[id_col] == row_id]
+    return match.iloc[0].to_dict() if not match.empty else None
+
+def _schema(df):
+    """Hashable (column, dtype) key for per-schema caches."""
+    return tuple((c, str(t)) for c, t in df.dtypes.items())
+
+@st.cache_resource
+def _in_use_grid_options(schema, _df):
+    """AgGrid options for the Devices In Use table, built once per schema."""
+    # Configure AgGrid
+    gb = GridOptionsBuilder.from_dataframe(_df)
+    gb.configure_default_column(filter=True, sortable=True, resizable=True, wrapText=True, autoHeight=False)
+    gb.configure_selection(selection_mode="single", use_checkbox=True)
+    gb.configure_column("status", header_name="Status", width=120, cellRenderer=_STATUS_CELL_RENDERER)
+    if "deviceName" in _df.columns:
+        gb.configure_column("deviceName", header_name="Device Name", width=200, pinned="left")
+    if "serialNumber" in _df.columns:
+        gb.configure_column("serialNumber", header_name="Serial Number", width=180)
+    if "userPrincipalName" in _df.columns:
+        gb.configure_column("userPrincipalName", header_name="Assigned User", width=220)
+    if "createdDateTime" in _df.columns:
+        # already a formatted string; the string-parsing date filter keeps filtering by date
+        gb.configure_column("createdDateTime", header_name="Enrolled Date", width=150, type=["dateColumnFilter"])
+
+    gb.configure_column("id", hide=True)
+    return gb.build()
+
+@st.cache_resource
+def _items_grid_options(schema, _df):
+    """AgGrid options for the Items table, built once per schema."""
+    gb = GridOptionsBuilder.from_dataframe(_df)
+    gb.configure_default_column(filter=True, sortable=True, resizable=True)
+    gb.configure_selection(selection_mode="multiple", use_checkbox=True)
+    gb.configure_column("status", header_name="Status", cellClassRules=_ITEM_STATUS_CLASS_RULES, editable=False)
+    gb.configure_column("created_at", header_name="Created", type=["dateColumnFilter","customDateTimeFormat"], custom_format_string="yyyy-MM-dd HH:mm")
+    return gb.build()
+
 # ---------- Inventory UI ----------
+@st.fragment
+def _items_table(df):
+    """Items grid and the actions on its selection. A fragment: ticking rows reruns only this
+    block; the mutations below still rerun the whole page (metrics and other tabs change)."""
+    if not df.empty:
+        # dict cells (metadata_) push AgGrid's data hash onto a per-cell Python apply; it was hidden anyway
+        grid_df = df.drop(columns=["metadata_"], errors="ignore")
+
+        # show AgGrid table with nicer appearance
+        grid_options = _items_grid_options(_schema(grid_df), grid_df)
+        grid_response = AgGrid(
+            grid_df,
+            gridOptions=grid_options,
+            enable_enterprise_modules=False,
+            data_return_mode=DataReturnMode.FILTERED_AND_SORTED,
+            update_mode=GridUpdateMode.SELECTION_CHANGED,
+            fit_columns_on_grid_load=True,
+            key="items_grid",
+            height=420,
+            custom_css=_ITEM_STATUS_CSS,
+            allow_unsafe_jscode=True,
+        )
+        selected_rows = _selected_rows(grid_response)
+        if selected_rows:
+            st.session_state["selected_item"] = selected_rows[0]
+        sel = st.session_state.get("selected_item")
+        st.markdown("### Selected item")
+        if sel:
+            st.write(sel)
+            # action buttons for selected item
+            col_edit, col_alloc, col_delete = st.columns(3)
+            with col_edit:
+                if st.button("Edit selected"):
+                    with st.form("edit_item_form"):
+                        new_name = st.text_input("Name", value=sel.get("name", ""))
+                        new_location = st.text_input("Location", value=sel.get("location", "") or "")
+                        new_qty = st.number_input("Quantity", min_value=0, value=int(sel.get("quantity", 0)))
+                        if st.form_submit_button("Save changes") and not _debounced("edit_item_form"):
+                            payload = {"name": new_name, "location": new_location, "quantity": int(new_qty), "actor": "ui_user"}
+                            res = api_patch(f"/inventory/{int(sel['id'])}", payload)
+                            if res:
+                                st.success("Updated")
+                                clear_caches("inventory", "history")
+                                safe_rerun()
+            with col_alloc:
+                if st.button("Allocate item to device"):
+                    with st.form("allocate_item_form"):
+                        device_id = st.text_input("Device Graph ID")
+                        user_upn = st.text_input("User UPN (optional)")
+                        actor = st.text_input("Your name", value="admin")
+                        if st.form_submit_button("Allocate item"):
+                            # For items, you might implement an endpoint like /inventory/{id}/assign
+                            payload = {"item_id": int(sel["id"]), "device_graph_id": device_id, "user_upn": user_upn, "actor": actor}
+                            r = api_post_raw(f"/inventory/assign", payload)
+                            if r and getattr(r, "status_code", None) in (200,201):
+                                st.success("Allocated item")
+                                clear_caches("history")
+                                safe_rerun()
+                            else:
+                                st.error(f"Allocate failed: {r.status_code if r else ''} {r.text if r else ''}")
+            with col_delete:
+                # Use a form with explicit confirm checkbox and submit button
+                # deletes every checked row (or the last selected item) in one request
+                delete_ids = [int(r["id"]) for r in selected_rows if r.get("id")] or ([int(sel["id"])] if sel.get("id") else [])
+                with st.form("delete_item_form"):
+                    confirm = st.checkbox(f"Confirm delete {len(delete_ids)} item(s)?")
+                    if st.form_submit_button("Delete selected") and not _debounced("delete_item_form"):
+                        if not confirm:
+                            st.warning("Please confirm deletion by checking the box")
+                        elif not delete_ids:
+                            st.error("Cannot determine item id to delete")
+                        else:
+                            _bulk_delete("/inventory/bulk_delete", delete_ids, "item(s)")
+    else:
+        st.info("No inventory items found. Create a new item below.")
+
+# page datasets by name, fetched together on the page's thread pool
+_PAGE_FETCHES = {
+    "stats": get_inventory_stats,
+    "items": lambda: get_items_frame(limit=1000),
+    "license_frame": get_license_frame,
+    "license_choices": get_license_choices,
+    "in_use": get_devices_in_use,
+    "in_stock": get_devices_in_stock,
+    "users": get_user_options,
+    "history": lambda: get_history_frame(limit=HISTORY_LIMIT),
+}
+
+# inventory sections and the datasets each one reads (st.tabs would run, and fetch for, every body)
+INVENTORY_SECTIONS = {
+    "Devices In Use": ("in_use",),
+    "Devices In Stock": ("in_stock", "users"),
+    "Items": ("items",),
+    "Licenses": ("license_frame",),
+    "Assign / Return": ("license_choices", "history"),
+    "History": ("history",),
+    "Import/Export": (),
+}
+
 def render_inventory_page():
+    # the version this render's data reflects; _watch_changes reruns the page when it moves
+    st.session_state["inventory_version"] = _invalidate_on_change()
+    _reset_change_poll()
+    _watch_changes()
+    # row dumps on error paths are opt-in: a wide row (metadata_ blobs) is costly to render
+    st.sidebar.toggle("Debug mode", value=False, key="debug_mode")
     st.title("Inventory Management")
     left, right = st.columns([3, 1])
 
@@ -220,145 +801,105 @@ def render_inventory_page():
     if "selected_device_in_use" not in st.session_state:
         st.session_state["selected_device_in_use"] = None
 
+    # only the selected section renders, so only its datasets (plus the overview stats) are fetched;
+    # they don't depend on each other: a cold load waits for the slowest, not the sum
+    active = st.radio("Section", list(INVENTORY_SECTIONS), horizontal=True, key="inventory_section", label_visibility="collapsed")
+    data = _parallel_fetch({name: _PAGE_FETCHES[name] for name in ("stats",) + INVENTORY_SECTIONS[active]})
+
     # Top quick stats
     with left:
-        items = get_inventory_items(limit=1000)
-        total_items = len(items)
-        total_quantity = sum([i.get("quantity", 0) for i in items]) if items else 0
+        stats = data["stats"]
 
         st.markdown("### Overview")
         c1, c2, c3 = st.columns(3)
-        c1.metric("SKUs", f"{total_items:,}")
-        c2.metric("Total qty", f"{total_quantity:,}")
-        low_stock = sum(1 for i in items if i.get("quantity", 0) <= LOW_STOCK_THRESHOLD)
-        c3.metric("Low stock SKUs", f"{low_stock:,}")
+        c1.metric("SKUs", f"{stats.get('sku_count', 0):,}")
+        c2.metric("Total qty", f"{stats.get('total_qty', 0):,}")
+        c3.metric("Low stock SKUs", f"{stats.get('low_stock_count', 0):,}")
 
     with right:
         st.markdown("### Actions")
         if st.button("Refresh data"):
-            get_inventory_items.clear()
-            get_license_pools.clear()
-            get_devices_in_stock.clear()
-            get_devices_in_use.clear()
+            clear_caches(*_CACHED_GETTERS)
             st.rerun()
         # quick links
         st.markdown("#### Import / Export")
-        st.write("- Use Import/Export tab to bulk operations")
+        st.write("- Use the Import/Export section for bulk operations")
 
     st.markdown("---")
 
-    tabs = st.tabs(["Devices In Use", "Devices In Stock", "Items", "Licenses", "Assign / Return", "History", "Import/Export"])
-
     # ---- Devices In Use tab ----
-    with tabs[0]:
+    if active == "Devices In Use":
         col1, col2 = st.columns([3, 1])
         with col1:
             st.subheader("📱 Devices In Use (Intune Managed)")
         with col2:
             if st.button("🔄 Refresh", key="refresh_in_use"):
-                get_devices_in_use.clear()
+                clear_caches("in_use")
                 st.rerun()
         
         st.markdown("*Live data from Microsoft Intune - read-only view*")
         
-        with st.spinner("Loading devices from Intune..."):
-            devices = get_devices_in_use()
+        devices = data["in_use"]
         
         if devices:
             dfd = pd.DataFrame(devices)
             
-            # Format columns for display
-            display_columns = []
-            if "deviceName" in dfd.columns:
-                display_columns.append("deviceName")
-            elif "device_name" in dfd.columns:
-                dfd.rename(columns={"device_name": "deviceName"}, inplace=True)
-                display_columns.append("deviceName")
-            elif "name" in dfd.columns:
-                dfd.rename(columns={"name": "deviceName"}, inplace=True)
-                display_columns.append("deviceName")
-            
-            if "serialNumber" in dfd.columns:
-                display_columns.append("serialNumber")
-            elif "serial_number" in dfd.columns:
-                dfd.rename(columns={"serial_number": "serialNumber"}, inplace=True)
-                display_columns.append("serialNumber")
-            elif "serial" in dfd.columns:
-                dfd.rename(columns={"serial": "serialNumber"}, inplace=True)
-                display_columns.append("serialNumber")
-            
-            if "userPrincipalName" in dfd.columns:
-                display_columns.append("userPrincipalName")
-            elif "user_upn" in dfd.columns:
-                dfd.rename(columns={"user_upn": "userPrincipalName"}, inplace=True)
-                display_columns.append("userPrincipalName")
-            elif "assigned_to" in dfd.columns:
-                dfd.rename(columns={"assigned_to": "userPrincipalName"}, inplace=True)
-                display_columns.append("userPrincipalName")
+            # Normalize Intune / local field names in one rename; the first alias found wins
+            present = set(dfd.columns)
+            aliases = {}
+            for src, dst in _IN_USE_ALIASES.items():
+                if src in present and dst not in present and dst not in aliases.values():
+                    aliases[src] = dst
+            dfd.rename(columns=aliases, inplace=True)
             
             if "createdDateTime" in dfd.columns:
                 dfd["createdDateTime"] = pd.to_datetime(dfd["createdDateTime"], errors="coerce").dt.strftime("%Y-%m-%d %H:%M")
-                display_columns.append("createdDateTime")
-            elif "created_at" in dfd.columns:
-                dfd["createdDateTime"] = pd.to_datetime(dfd["created_at"], errors="coerce").dt.strftime("%Y-%m-%d %H:%M")
-                display_columns.append("createdDateTime")
-            
-            if "model" in dfd.columns:
-                display_columns.append("model")
-            if "os" in dfd.columns or "operatingSystem" in dfd.columns:
-                if "operatingSystem" not in dfd.columns and "os" in dfd.columns:
-                    dfd.rename(columns={"os": "operatingSystem"}, inplace=True)
-                display_columns.append("operatingSystem")
             
             # Add status badge
             dfd["status"] = "In Use"
-            display_columns.insert(0, "status")
+            display_columns = [c for c in _IN_USE_COLUMNS if c in dfd.columns]
             
             # Show metrics
             st.markdown(f"**Total Devices:** {len(dfd)} | 🟢 **Status:** Active")
             st.markdown("---")
             
-            # Configure AgGrid
-            gb = GridOptionsBuilder.from_dataframe(dfd[display_columns] if display_columns else dfd)
-            gb.configure_default_column(filter=True, sortable=True, resizable=True, wrapText=True, autoHeight=False)
-            gb.configure_selection(selection_mode="single", use_checkbox=True)
-            gb.configure_column("status", header_name="Status", width=120, cellStyle={"color": "white", "backgroundColor": "#10b981", "fontWeight": "600", "textAlign": "center"})
-            if "deviceName" in display_columns:
-                gb.configure_column("deviceName", header_name="Device Name", width=200, pinned="left")
-            if "serialNumber" in display_columns:
-                gb.configure_column("serialNumber", header_name="Serial Number", width=180)
-            if "userPrincipalName" in display_columns:
-                gb.configure_column("userPrincipalName", header_name="Assigned User", width=220)
-            if "createdDateTime" in display_columns:
-                gb.configure_column("createdDateTime", header_name="Enrolled Date", width=150)
-            
-            if "metadata_" in dfd.columns:
-                gb.configure_column("metadata_", hide=True)
-            if "id" in dfd.columns:
-                gb.configure_column("id", hide=True)
+            if "id" not in dfd.columns:
+                dfd["id"] = range(len(dfd))
             
-            gb.configure_pagination(enabled=True, paginationPageSize=20)
-            grid_opts = gb.build()
-            
-            grid = AgGrid(
-                dfd[display_columns] if display_columns else dfd,
-                gridOptions=grid_opts,
-                enable_enterprise_modules=False,
-                fit_columns_on_grid_load=True,
-                theme="streamlit",
-                key="devices_in_use_grid",
-                height=500,
-                allow_unsafe_jscode=True
-            )
-            
-            sel_list = grid.get("selected_rows")
-            if sel_list is not None and not (isinstance(sel_list, pd.DataFrame) and sel_list.empty) and len(sel_list) > 0:
-                if isinstance(sel_list, pd.DataFrame):
-                    st.session_state["selected_device_in_use"] = sel_list.iloc[0].to_dict()
-                else:
-                    st.session_state["selected_device_in_use"] = sel_list[0]
+            if len(dfd) < AGGRID_MIN_ROWS:
+                # small table: st.dataframe skips AgGrid's JS bootstrap and component round-trip
+                event = st.dataframe(dfd[display_columns], use_container_width=True, hide_index=True,
+                                     on_select="rerun", selection_mode="single-row", key="devices_in_use_table")
+                if event.selection.rows:
+                    st.session_state["selected_device_in_use"] = dfd["id"].iloc[event.selection.rows[0]]
+            else:
+                # Only the current page goes to the grid (and back through the component state),
+                # so the per-rerun cost follows IN_USE_PAGE_SIZE, not the fleet size
+                grid_columns = display_columns + ["id"]
+                n_pages = max(1, -(-len(dfd) // IN_USE_PAGE_SIZE))
+                page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, key="in_use_page") if n_pages > 1 else 1
+                page_df = dfd[grid_columns].iloc[(page - 1) * IN_USE_PAGE_SIZE:page * IN_USE_PAGE_SIZE]
+
+                grid_opts = _in_use_grid_options(_schema(page_df), page_df)
+                
+                grid = AgGrid(
+                    page_df,
+                    gridOptions=grid_opts,
+                    update_mode=GridUpdateMode.SELECTION_CHANGED,
+                    enable_enterprise_modules=False,
+                    fit_columns_on_grid_load=True,
+                    theme="streamlit",
+                    key="devices_in_use_grid",
+                    height=500,
+                    allow_unsafe_jscode=True
+                )
+                
+                selected = _first_selected(grid)
+                if selected:
+                    # keep only the id in session state; the row is looked up again each run
+                    st.session_state["selected_device_in_use"] = selected["id"]
             
-            row = st.session_state.get("selected_device_in_use")
+            row = _row_by_id(dfd, st.session_state.get("selected_device_in_use"))
             if row:
                 st.markdown("---")
                 st.markdown("### 📋 Device Details")
@@ -376,7 +917,7 @@ def render_inventory_page():
             st.info("📭 No devices currently enrolled in Intune.")
 
     # ---- Devices In Stock tab ----
-    with tabs[1]:
+    if active == "Devices In Stock":
         # Header with icon
         col_header, col_refresh = st.columns([6, 1])
         with col_header:
@@ -384,7 +925,7 @@ def render_inventory_page():
             st.markdown("*Local inventory - devices not yet enrolled in Intune*")
         with col_refresh:
             if st.button("🔄 Refresh", key="refresh_in_stock", use_container_width=True):
-                safe_clear_cache()
+                clear_caches("stock")
                 safe_rerun()
         
         # Add Device Button - Collapsible
@@ -438,9 +979,9 @@ def render_inventory_page():
                                 res = api_post_raw("/inventory/devices", {"item": item_payload, "laptop": laptop_payload, "actor": actor}, timeout=30)
                                 if res and getattr(res, "status_code", None) in (200, 201):
                                     st.success(f"✅ Device '{device_name}' added successfully!")
-                                    # Clear specific caches
-                                    get_devices_in_stock.clear()
-                                    get_inventory_items.clear()
+                                    # Show the created row right away instead of refetching the whole stock list
+                                    st.session_state.setdefault("stock_optimistic", []).append(res.json()["laptop"])
+                                    clear_caches("inventory", "history")
                                     st.rerun()
                                 else:
                                     st.error(f"❌ Failed to add device: {res.status_code if res else 'No response'} - {res.text if res else ''}")
@@ -449,23 +990,15 @@ def render_inventory_page():
         
         st.markdown("---")
         
-        with st.spinner("Loading stock devices..."):
-            devices = get_devices_in_stock()
+        devices = _with_optimistic(data["in_stock"], "stock_optimistic")
         
         if devices:
             dfd = pd.DataFrame(devices)
             
-            # Standardize column names
-            column_mapping = {
-                "asset_tag": "assetCode",
-            }
-            for old_col, new_col in column_mapping.items():
-                if old_col in dfd.columns and new_col not in dfd.columns:
-                    dfd.rename(columns={old_col: new_col}, inplace=True)
-            
-            # Ensure assetCode exists
-            if "assetCode" not in dfd.columns:
-                dfd["assetCode"] = ""
+            # Standardize column names and fill missing ones in one pass each
+            present = set(dfd.columns)
+            dfd = dfd.rename(columns={k: v for k, v in _STOCK_ALIASES.items() if v not in present})
+            dfd = dfd.assign(**{c: v for c, v in _STOCK_DEFAULTS.items() if c not in dfd.columns})
             
             # Format dates
             if "updated_at" in dfd.columns:
@@ -473,143 +1006,20 @@ def render_inventory_page():
             elif "created_at" in dfd.columns:
                 dfd["updated_at"] = pd.to_datetime(dfd["created_at"], errors="coerce").dt.strftime("%Y-%m-%d %H:%M")
             
-            # Format device_type
-            if "device_type" not in dfd.columns:
-                dfd["device_type"] = "Laptop"
-            
-            # Add status column
-            if "status" not in dfd.columns:
-                dfd["status"] = "in_stock"
+            # Fixed column order (unknown server fields go last) keeps the grid-options cache key stable
+            dfd = dfd[[c for c in _STOCK_FINAL_COLS if c in dfd.columns] + [c for c in dfd.columns if c not in _STOCK_FINAL_COLS]]
             
             # Show metrics
             st.markdown(f"**Total In Stock:** {len(dfd)} | 🔵 **Status:** Available")
             st.markdown("---")
             
-            # Configure AgGrid with modern dark theme
-            gb = GridOptionsBuilder.from_dataframe(dfd)
-            
-            # Default column configuration
-            gb.configure_default_column(
-                filter=True, 
-                sortable=True, 
-                resizable=True, 
-                wrapText=False,
-                autoHeight=False
-            )
-            
-            # Selection with checkbox
-            gb.configure_selection(
-                selection_mode="single", 
-                use_checkbox=True,
-                header_checkbox=False,
-                pre_selected_rows=[]
-            )
-            
-            # Status column with custom renderer (blue badge for "in_stock")
-            status_cell_renderer = JsCode("""
-                function(params) {
-                    const status = params.value;
-                    if (status === 'in_stock') {
-                        return '<span style="display: inline-block; padding: 4px 12px; border-radius: 12px; background-color: #3b82f6; color: white; font-weight: 600; font-size: 12px;">In Stock</span>';
-                    } else if (status === 'in_use') {
-                        return '<span style="display: inline-block; padding: 4px 12px; border-radius: 12px; background-color: #10b981; color: white; font-weight: 600; font-size: 12px;">In Use</span>';
-                    } else if (status === 'retired') {
-                        return '<span style="display: inline-block; padding: 4px 12px; border-radius: 12px; background-color: #6b7280; color: white; font-weight: 600; font-size: 12px;">Retired</span>';
-                    }
-                    return status;
-                }
-            """)
-            
-            gb.configure_column(
-                "status", 
-                header_name="Status", 
-                width=130,
-                cellRenderer=status_cell_renderer
-            )
-            
-            # Asset Code column (pinned left)
-            if "assetCode" in dfd.columns:
-                gb.configure_column("assetCode", header_name="Asset Code", width=130, pinned="left")
-            
-            # Device Type
-            if "device_type" in dfd.columns:
-                gb.configure_column("device_type", header_name="Device Type", width=130)
-            
-            # Model
-            if "model" in dfd.columns:
-                gb.configure_column("model", header_name="Model", width=180)
-            
-            # Serial Number
-            if "serialNumber" in dfd.columns:
-                gb.configure_column("serialNumber", header_name="Serial Number", width=180)
-            
-            # Company
-            if "company" in dfd.columns:
-                gb.configure_column("company", header_name="Company", width=150)
-            
-            # OS
-            if "os" in dfd.columns:
-                gb.configure_column("os", header_name="OS", width=130)
-            
-            # Assigned To ID
-            if "assigned_to_id" in dfd.columns:
-                gb.configure_column("assigned_to_id", header_name="Assigned To ID", width=180)
-            
-            # Device Graph ID
-            if "device_graph_id" in dfd.columns:
-                gb.configure_column("device_graph_id", header_name="Device Graph ID", width=180)
-            
-            # Notes with tooltip
-            if "notes" in dfd.columns:
-                gb.configure_column(
-                    "notes", 
-                    header_name="Notes", 
-                    width=200,
-                    tooltipField="notes",
-                    cellStyle={"whiteSpace": "nowrap", "overflow": "hidden", "textOverflow": "ellipsis"}
-                )
-            
-            # Updated At
-            if "updated_at" in dfd.columns:
-                gb.configure_column("updated_at", header_name="Updated At", width=160)
-            
-            # Location
-            if "location" in dfd.columns:
-                gb.configure_column("location", header_name="Location", width=150)
-            
-            # Hide internal IDs
-            if "metadata_" in dfd.columns:
-                gb.configure_column("metadata_", hide=True)
-            if "id" in dfd.columns:
-                gb.configure_column("id", hide=True)
-            if "item_id" in dfd.columns:
-                gb.configure_column("item_id", hide=True)
-            
-            # Pagination
-            gb.configure_pagination(
-                enabled=True, 
-                paginationPageSize=25,
-                paginationAutoPageSize=False
-            )
-            
-            # Grid options for better UX
-            gb.configure_grid_options(
-                domLayout="normal",
-                rowHeight=45,
-                headerHeight=48,
-                animateRows=True,
-                suppressMovableColumns=False
-            )
-            
-            grid_opts = gb.build()
-            
             # Sanitize object/text columns to strip any HTML (prevents broken span/html rendering)
             dfd_clean = dfd.copy()
-            for c in dfd_clean.select_dtypes(include=["object"]).columns:
+            for c in dfd_clean.select_dtypes(include=["object", "string"]).columns:
                 # keep metadata_ intact (it's structured) but convert to readable string if needed
                 if c == "metadata_":
                     continue
-                dfd_clean[c] = dfd_clean[c].fillna("").astype(str).map(_strip_html)
+                dfd_clean[c] = _strip_html_col(dfd_clean[c])
             
             # Hide heavy/structured columns from the quick table (but keep them in dfd_clean for detail view)
             display_df = dfd_clean.copy()
@@ -619,26 +1029,26 @@ def render_inventory_page():
             # Show clean dataframe (like Licenses tab)
             st.dataframe(display_df, use_container_width=True)
             
-            # Build labels -> index mapping for robust selection (works with non-integer indices)
-            labels = []
-            label_to_index = {}
-            for idx, row in dfd_clean.iterrows():
-                serial = row.get("serialNumber") or row.get("serial") or ""
-                model = row.get("model") or ""
-                label = f"{idx} | {serial} | {model}"
-                labels.append(label)
-                label_to_index[label] = idx
+            # Build labels -> index mapping for robust selection (works with non-integer indices);
+            # one vectorized string concat instead of an iterrows() pass (text columns are already str)
+            labels = (
+                dfd_clean.index.to_series().astype(str)
+                + " | " + dfd_clean.get("serialNumber", "")
+                + " | " + dfd_clean.get("model", "")
+            ).tolist()
+            label_to_index = dict(zip(labels, dfd_clean.index))
             
             if labels:
                 sel_label = st.selectbox("Select device (for details/actions)", options=labels)
                 sel_index = label_to_index.get(sel_label)
                 if sel_index is not None:
-                    # use sanitized row for details/actions
-                    st.session_state["selected_device_in_stock"] = dfd_clean.loc[sel_index].to_dict()
+                    # only the laptop id is kept in session state
+                    st.session_state["selected_device_in_stock"] = dfd_clean.at[sel_index, "id"]
             else:
                 st.session_state["selected_device_in_stock"] = None
             
-            row = st.session_state.get("selected_device_in_stock")
+            # use sanitized row for details/actions
+            row = _row_by_id(dfd_clean, st.session_state.get("selected_device_in_stock"))
             if row:
                 st.markdown("---")
                 st.markdown("### 📋 Selected Device Actions")
@@ -687,8 +1097,7 @@ def render_inventory_page():
                                     if res:
                                         st.success("✅ Device updated successfully!")
                                         st.session_state["show_edit_form"] = False
-                                        get_devices_in_stock.clear()
-                                        get_inventory_items.clear()
+                                        clear_caches("inventory", "stock", "history")
                                         st.rerun()
                         with col_cancel:
                             if st.form_submit_button("❌ Cancel", use_container_width=True):
@@ -700,7 +1109,7 @@ def render_inventory_page():
                     st.warning("⚠️ Are you sure you want to delete this device from inventory?")
                     col_yes, col_no = st.columns(2)
                     with col_yes:
-                        if st.button("✅ Yes, Delete", type="primary", use_container_width=True):
+                        if st.button("✅ Yes, Delete", type="primary", use_container_width=True) and not _debounced("delete_device"):
                             # For devices in stock, we need the laptop.id (not item_id)
                             # The Laptop table has both 'id' (laptop primary key) and 'item_id' (foreign key to InventoryItem)
                             laptop_id = row.get("id")
@@ -709,24 +1118,25 @@ def render_inventory_page():
                                 try:
                                     st.info(f"Deleting device (laptop_id: {laptop_id})...")
                                     # Use the new device-specific delete endpoint
-                                    r = requests.delete(f"{API_BASE}/inventory/devices/{int(laptop_id)}", headers=_headers())
+                                    r = _SESSION.delete(f"{API_BASE}/inventory/devices/{int(laptop_id)}", timeout=(CONNECT_TIMEOUT_SEC, 30))
                                     if r.ok:
                                         st.success("✅ Device deleted successfully!")
                                         st.session_state["show_delete_confirm"] = False
                                         st.session_state["selected_device_in_stock"] = None
                                         # Clear specific caches
-                                        get_devices_in_stock.clear()
-                                        get_inventory_items.clear()
+                                        clear_caches("inventory", "stock", "history")
                                         st.rerun()
                                     else:
                                         st.error(f"❌ Delete failed: {r.status_code} - {r.text}")
-                                        st.info("Debug info - Row data:")
-                                        st.json(row)
+                                        if st.session_state.get("debug_mode"):
+                                            st.info("Debug info - Row data:")
+                                            st.json(row)
                                 except Exception as e:
                                     st.error(f"❌ Error deleting device: {str(e)}")
                             else:
                                 st.error("❌ Cannot find device ID in selected row. Available fields: " + ", ".join(row.keys()))
-                                st.json(row)
+                                if st.session_state.get("debug_mode"):
+                                    st.json(row)
                     with col_no:
                         if st.button("❌ Cancel", use_container_width=True):
                             st.session_state["show_delete_confirm"] = False
@@ -735,137 +1145,59 @@ def render_inventory_page():
                 # Assign to user section
                 st.markdown("---")
                 with st.expander("👤 Assign Device to User"):
-                    users = get_users()
+                    upns, user_labels = data["users"]
                     with st.form("assign_form"):
-                        if users:
-                            users_map = {u.get("userPrincipalName"): (u.get("displayName") or u.get("userPrincipalName")) for u in users}
-                            user_upn = st.selectbox("Select User", options=list(users_map.keys()), format_func=lambda k: f"{users_map[k]} ({k})")
+                        if upns:
+                            user_upn = st.selectbox("Select User", options=upns, format_func=user_labels.__getitem__)
                         else:
                             user_upn = st.text_input("User Principal Name (UPN)")
                         actor = st.text_input("Actor", value="ui_user")
-                        if st.form_submit_button("✅ Assign to User", use_container_width=True):
-                            item_id = row.get("item_id") or row.get("id")
+                        col_now, col_queue = st.columns(2)
+                        assign_now = col_now.form_submit_button("✅ Assign to User", use_container_width=True)
+                        queue = col_queue.form_submit_button("➕ Add to batch", use_container_width=True)
+                        item_id = row.get("item_id") or row.get("id")
+                        if queue:
+                            if item_id:
+                                _queue_assign(int(item_id), user_upn, None, actor)
+                                st.success(f"Queued {row.get('serialNumber') or item_id} for {user_upn}")
+                            else:
+                                st.error("❌ Cannot determine item ID for this device")
+                        elif assign_now and not _debounced("assign_form"):
                             if item_id:
                                 with st.spinner("Assigning device..."):
                                     r = api_assign_device(int(item_id), user_upn, None, actor)
                                     if r and getattr(r, "status_code", None) in (200, 201):
                                         st.success("✅ Device assigned successfully!")
                                         # Clear specific caches
-                                        get_devices_in_stock.clear()
-                                        get_devices_in_use.clear()
-                                        get_inventory_items.clear()
+                                        clear_caches("inventory", "stock", "in_use", "history")
                                         st.rerun()
                                     else:
                                         st.error(f"❌ Assignment failed: {getattr(r, 'status_code', '')} {getattr(r, 'text', '')}")
                             else:
                                 st.error("❌ Cannot determine item ID for this device")
+
+            _pending_assigns_panel()
+
+            # Bulk delete: one request for the whole selection
+            with st.expander("🗑️ Delete multiple devices"):
+                with st.form("bulk_delete_devices_form"):
+                    bulk_labels = st.multiselect("Devices to delete", options=labels)
+                    confirm_bulk = st.checkbox("Confirm deletion of the selected devices")
+                    if st.form_submit_button("🗑️ Delete selected", use_container_width=True) and not _debounced("bulk_delete_devices_form"):
+                        ids = [int(dfd_clean.at[label_to_index[label], "id"]) for label in bulk_labels]
+                        if not ids:
+                            st.warning("Select at least one device")
+                        elif not confirm_bulk:
+                            st.warning("Please confirm deletion by checking the box")
+                        else:
+                            _bulk_delete("/inventory/devices/bulk_delete", ids, "device(s)")
         else:
             st.info("📭 No devices in stock. Add your first device using the form above!")
 
     # ---- Items tab ----
-    with tabs[2]:
+    if active == "Items":
         st.subheader("Inventory items")
-        items = get_inventory_items(limit=1000)
-        if items:
-            df = pd.DataFrame(items)
-            if "quantity" in df.columns:
-                df["available"] = df["quantity"]
-                # Add status column
-                def status_badge(q):
-                    if q <= 0:
-                        return "out"
-                    if q <= LOW_STOCK_THRESHOLD:
-                        return "low"
-                    return "ok"
-                df["status"] = df["available"].apply(status_badge)
-            else:
-                df["available"] = 0
-                df["status"] = "unknown"
-
-            # show AgGrid table with nicer appearance
-            gb = GridOptionsBuilder.from_dataframe(df)
-            gb.configure_default_column(filter=True, sortable=True, resizable=True)
-            gb.configure_selection(selection_mode="single", use_checkbox=False)
-            gb.configure_column("status", header_name="Status", cellRenderer="""function(params){
-                if(params.value=='low'){return '<span style="color:#d97706;font-weight:600'>LOW</span>'}
-                if(params.value=='out'){return '<span style="color:#d62728;font-weight:600'>OUT</span>'}
-                return '<span style="color:#2ca02c;font-weight:600'>OK</span>'}""", editable=False)
-            if "metadata_" in df.columns:
-                gb.configure_column("metadata_", hide=True)
-            gb.configure_column("created_at", header_name="Created", type=["dateColumnFilter","customDateTimeFormat"], custom_format_string="yyyy-MM-dd HH:mm")
-            grid_options = gb.build()
-            grid_response = AgGrid(
-                df,
-                gridOptions=grid_options,
-                enable_enterprise_modules=False,
-                data_return_mode=DataReturnMode.FILTERED_AND_SORTED,
-                update_mode=GridUpdateMode.SELECTION_CHANGED,
-                fit_columns_on_grid_load=True,
-                key="items_grid",
-                height=420,
-            )
-            selected = grid_response.get("selected_rows")
-            if selected is not None and not (isinstance(selected, pd.DataFrame) and selected.empty) and len(selected) > 0:
-                if isinstance(selected, pd.DataFrame):
-                    st.session_state["selected_item"] = selected.iloc[0].to_dict()
-                else:
-                    st.session_state["selected_item"] = selected[0]
-            sel = st.session_state.get("selected_item")
-            st.markdown("### Selected item")
-            if sel:
-                st.write(sel)
-                # action buttons for selected item
-                col_edit, col_alloc, col_delete = st.columns(3)
-                with col_edit:
-                    if st.button("Edit selected"):
-                        with st.form("edit_item_form"):
-                            new_name = st.text_input("Name", value=sel.get("name", ""))
-                            new_location = st.text_input("Location", value=sel.get("location", "") or "")
-                            new_qty = st.number_input("Quantity", min_value=0, value=int(sel.get("quantity", 0)))
-                            if st.form_submit_button("Save changes"):
-                                payload = {"name": new_name, "location": new_location, "quantity": int(new_qty), "actor": "ui_user"}
-                                res = api_patch(f"/inventory/{int(sel['id'])}", payload)
-                                if res:
-                                    st.success("Updated")
-                                    safe_rerun()
-                with col_alloc:
-                    if st.button("Allocate item to device"):
-                        with st.form("allocate_item_form"):
-                            device_id = st.text_input("Device Graph ID")
-                            user_upn = st.text_input("User UPN (optional)")
-                            actor = st.text_input("Your name", value="admin")
-                            if st.form_submit_button("Allocate item"):
-                                # For items, you might implement an endpoint like /inventory/{id}/assign
-                                payload = {"item_id": int(sel["id"]), "device_graph_id": device_id, "user_upn": user_upn, "actor": actor}
-                                r = api_post_raw(f"/inventory/assign", payload)
-                                if r and getattr(r, "status_code", None) in (200,201):
-                                    st.success("Allocated item")
-                                    safe_rerun()
-                                else:
-                                    st.error(f"Allocate failed: {r.status_code if r else ''} {r.text if r else ''}")
-                with col_delete:
-                    # Use a form with explicit confirm checkbox and submit button
-                    with st.form("delete_item_form"):
-                        confirm = st.checkbox("Confirm delete this item?")
-                        if st.form_submit_button("Delete item"):
-                            if not confirm:
-                                st.warning("Please confirm deletion by checking the box")
-                            else:
-                                try:
-                                    item_id = int(sel.get("id")) if sel and sel.get("id") else None
-                                    if not item_id:
-                                        st.error("Cannot determine item id to delete")
-                                    else:
-                                        r = requests.delete(f"{API_BASE}/inventory/{item_id}", headers=_headers())
-                                        if r.ok:
-                                            st.success("Deleted")
-                                            safe_rerun()
-                                        else:
-                                            st.error(f"Delete failed: {r.status_code} {r.text}")
-                                except Exception as e:
-                                    st.error(f"Delete request failed: {e}")
-        else:
-            st.info("No inventory items found. Create a new item below.")
+        _items_table(data["items"])
 
         with st.expander("Create a new inventory item"):
             with st.form("new_item"):
@@ -911,6 +1243,7 @@ def render_inventory_page():
 
                     if res and getattr(res, "status_code", None) in (200,201):
                         st.success("Created")
+                        clear_caches("inventory", "stock", "history")
                         try:
                             safe_rerun()
                         except Exception as e:
@@ -922,17 +1255,10 @@ def render_inventory_page():
                             st.error("Create failed")
 
     # ---- Licenses tab ----
-    with tabs[3]:
+    if active == "Licenses":
         st.subheader("License pools")
-        pools = get_license_pools()
-        if pools:
-            dfp = pd.DataFrame(pools)
-            dfp["available"] = dfp["total"] - dfp["allocated"]
-            def avail_color(x):
-                if x <= 0: return "❌ Out"
-                if x <= LOW_STOCK_THRESHOLD: return "⚠️ Low"
-                return "✅ Avail"
-            dfp["status"] = dfp["available"].apply(avail_color)
+        dfp = data["license_frame"]
+        if not dfp.empty:
             st.dataframe(dfp)
         else:
             st.info("No license pools.")
@@ -956,10 +1282,7 @@ def render_inventory_page():
                                 elif res.status_code in (200, 201):
                                     st.success("✅ License pool created successfully!")
                                     # Clear specific cache for license pools
-                                    get_license_pools.clear()
-                                    # Small delay to ensure DB commit completes
-                                    import time
-                                    time.sleep(0.1)
+                                    clear_caches("licenses", "history")
                                     st.rerun()
                                 else:
                                     error_msg = ""
@@ -973,13 +1296,12 @@ def render_inventory_page():
                                 st.error(f"❌ Unexpected error: {str(e)}")
 
     # ---- Assign / Return tab ----
-    with tabs[4]:
+    if active == "Assign / Return":
         st.subheader("Allocate license to user/device")
-        pools = get_license_pools()
-        if not pools:
+        choices = data["license_choices"]
+        if not choices:
             st.info("No licenses. Create a license pool first.")
         else:
-            choices = {p["id"]: f'{p["sku"]} (avail {p["total"]-p["allocated"]})' for p in pools}
             license_id = st.selectbox("License pool", options=list(choices.keys()), format_func=lambda k: choices[k])
             user_upn = st.text_input("User UPN (e.g. user@company.com)")
             device_graph_id = st.text_input("Device Graph ID (optional)")
@@ -989,13 +1311,13 @@ def render_inventory_page():
                 r = api_post_raw(f"/inventory/licenses/{license_id}/allocate", payload)
                 if r and r.status_code == 200:
                     st.success("Allocated")
+                    clear_caches("licenses", "history")
                 else:
                     st.error(f"Allocate failed: {r.status_code if r else ''} {r.text if r else ''}")
 
         st.markdown("---")
         st.subheader("Return / Revoke assignment")
-        hist = get_history(limit=200)
-        dfhist = pd.DataFrame(hist)
+        dfhist = data["history"]
         if not dfhist.empty:
             st.dataframe(dfhist.head(50))
             with st.form("return_form"):
@@ -1005,49 +1327,48 @@ def render_inventory_page():
                     r = api_post_raw(f"/inventory/assignments/{int(assignment_id)}/return", {"actor": actor_r})
                     if r and r.status_code == 200:
                         st.success("Returned")
+                        clear_caches("licenses", "history")
                     else:
                         st.error(f"Return failed: {r.status_code if r else ''} {r.text if r else ''}")
         else:
             st.info("No history available to return.")
 
     # ---- History tab ----
-    with tabs[5]:
+    if active == "History":
         st.subheader("Inventory history / audit")
-        history = get_history(limit=500)
-        if history:
-            dfh = pd.DataFrame(history)
-            if "timestamp" in dfh.columns:
-                dfh["timestamp"] = pd.to_datetime(dfh["timestamp"])
-            st.dataframe(dfh.sort_values("timestamp", ascending=False))
+        dfh = data["history"]
+        if not dfh.empty:
+            st.dataframe(dfh)
         else:
             st.info("No history records.")
 
     # ---- Import / Export tab ----
-    with tabs[6]:
+    if active == "Import/Export":
         st.subheader("Import / Export")
         st.markdown("Bulk import CSV to create inventory items. CSV columns: sku,name,item_type,quantity,location")
         uploaded = st.file_uploader("Upload CSV", type=["csv"])
         if uploaded:
             try:
-                df = pd.read_csv(uploaded)
-                st.write(df.head())
+                table = _read_csv(uploaded)
+                st.write(table.slice(0, 5).to_pandas())
                 if st.button("Import to inventory"):
-                    payload = {"items": df.to_dict(orient="records")}
-                    r = api_post_raw("/inventory/bulk_import", payload, timeout=120)
-                    if r and getattr(r, "status_code", None) in (200,201):
-                        st.success(f"Imported {r.json().get('imported', 'N/A')} records")
-                        safe_rerun()
-                    else:
-                        st.error(f"Import failed: {r.status_code if r else ''} {r.text if r else ''}")
+                    _report_import(*_import_csv(table, st.progress(0.0, text="Importing...")))
+                failed = st.session_state.get("import_failed")
+                if failed and st.button(f"Retry {len(failed)} failed batch(es)"):
+                    progress = st.progress(0.0, text="Retrying...")
+                    _report_import(*_import_batches(failed, progress, lambda n: n / len(failed)))
             except Exception as e:
                 st.error(f"Failed to parse CSV: {e}")
 
         # Export
-        items = get_inventory_items(limit=10000)
-        if items:
-            df = pd.DataFrame(items)
-            csv = df.to_csv(index=False).encode("utf-8")
-            st.download_button("Download inventory CSV", data=csv, file_name="inventory_export.csv", mime="text/csv")
+        # built only when the button is clicked (on Streamlit's download thread), not on every page load
+        if data["stats"].get("sku_count"):
+            st.download_button(
+                "Download inventory CSV (gz)",
+                data=lambda: get_export_csv_gz(limit=10000) or b"",
+                file_name="inventory_export.csv.gz",
+                mime="application/gzip",
+            )
         else:
             st.info("No inventory to export.")
 
@@ -1065,14 +1386,11 @@ def render_about():
     - Protect mutating endpoints with API key or Azure AD in production.
     """)
 
-def _strip_html(text: str) -> str:
-    if text is None:
-        return ""
-    s = str(text)
-    s = _html.unescape(s)
-    # remove any HTML tags (handles unclosed tags too)
-    s = re.sub(r"<[^>]*>", "", s)
-    # collapse whitespace/newlines
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
+def _strip_html_col(col: pd.Series) -> pd.Series:
+    """Plain text of every cell: entities unescaped, HTML tags (unclosed ones too) removed,
+    whitespace collapsed. Vectorized; html.unescape runs only on cells containing an entity."""
+    s = col.fillna("").astype(str)
+    has_entity = s.str.contains("&", regex=False)
+    if has_entity.any():
+        s = s.where(~has_entity, s[has_entity].map(_html.unescape))
+    return s.str.replace(r"<[^>]*>", "", regex=True).str.replace(r"\s+", " ", regex=True).str.strip()
@@ -0,0 +1,30 @@
+import os
+
+# app.database builds its engine at import: keep it off the dev.db file
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from app.database import get_session
+from app.inventory_routes import router as inventory_router
+
+@pytest.fixture
+def session():
+    """Fresh in-memory SQLite database per test, one shared connection."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as s:
+        yield s
+    engine.dispose()
+
+@pytest.fixture
+def client(session):
+    app = FastAPI()
+    app.include_router(inventory_router)
+    app.dependency_overrides[get_session] = lambda: session
+    with TestClient(app) as c:
+        yield c
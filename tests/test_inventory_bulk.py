@@ -0,0 +1,148 @@
+import pytest
+from sqlalchemy import update
+from sqlmodel import select, func
+
+from app.inventory_crud import create_assignment_for_item
+from app.inventory_models import Assignment, InventoryHistory, InventoryItem, Laptop, LicensePool
+
+def _count(session, model):
+    return session.scalar(select(func.count()).select_from(model))
+
+def _pool(client, total):
+    r = client.post("/api/inventory/licenses", json={"sku": "M365", "total": total})
+    assert r.status_code == 201, r.text
+    return r.json()
+
+def _items(client, n):
+    return [client.post("/api/inventory/", json={"sku": f"S{i}", "name": f"n{i}"}).json()["id"] for i in range(n)]
+
+# /licenses/{id}/allocate/bulk
+
+def test_allocate_bulk_within_capacity(client, session):
+    pool = _pool(client, total=3)
+    r = client.post(f"/api/inventory/licenses/{pool['id']}/allocate/bulk", json={"items": [{"user_upn": "a@x"}, {"user_upn": "b@x"}]})
+    assert r.status_code == 201, r.text
+    assert [a["user_upn"] for a in r.json()] == ["a@x", "b@x"]
+    assert session.get(LicensePool, pool["id"]).allocated == 2
+
+def test_allocate_bulk_over_capacity_rejects_whole_batch(client, session):
+    pool = _pool(client, total=2)
+    history_before = _count(session, InventoryHistory)
+    r = client.post(f"/api/inventory/licenses/{pool['id']}/allocate/bulk",
+                    json={"items": [{"user_upn": f"u{i}@x"} for i in range(3)]})
+    assert r.status_code == 400, r.text
+    assert session.get(LicensePool, pool["id"]).allocated == 0
+    assert _count(session, Assignment) == 0
+    assert _count(session, InventoryHistory) == history_before
+
+def test_allocate_bulk_unknown_pool_is_404(client):
+    r = client.post("/api/inventory/licenses/999/allocate/bulk", json={"items": [{"user_upn": "a@x"}]})
+    assert r.status_code == 404, r.text
+
+def test_second_return_is_rejected(client, session):
+    pool = _pool(client, total=1)
+    a = client.post(f"/api/inventory/licenses/{pool['id']}/allocate/bulk", json={"items": [{"user_upn": "a@x"}]}).json()[0]
+    r = client.post(f"/api/inventory/assignments/{a['id']}/return", json={"actor": "t"})
+    assert r.status_code == 200, r.text
+    assert r.json()["status"] == "returned"
+    r = client.post(f"/api/inventory/assignments/{a['id']}/return", json={"actor": "t"})
+    assert r.status_code == 400, r.text
+    # the seat was released once, not twice
+    assert session.get(LicensePool, pool["id"]).allocated == 0
+
+# /bulk_delete
+
+def test_bulk_delete_items(client, session):
+    ids = _items(client, 3)
+    r = client.post("/api/inventory/bulk_delete", json={"ids": ids[:2]})
+    assert r.status_code == 200, r.text
+    assert sorted(r.json()["deleted"]) == ids[:2]
+    assert session.scalars(select(InventoryItem.id)).all() == ids[2:]
+
+def test_bulk_delete_partial_missing_id_is_404_and_deletes_nothing(client, session):
+    ids = _items(client, 2)
+    history_before = _count(session, InventoryHistory)
+    r = client.post("/api/inventory/bulk_delete", json={"ids": [ids[0], 999]})
+    assert r.status_code == 404, r.text
+    assert "999" in r.json()["detail"]
+    assert sorted(session.scalars(select(InventoryItem.id)).all()) == ids
+    assert _count(session, InventoryHistory) == history_before
+
+# /devices/bulk, /assign/bulk, /devices/bulk_delete
+
+def _devices(client, n):
+    devices = [{"item": {"sku": f"SN{i}", "name": f"XPS{i}", "quantity": 1}, "laptop": {"serial": f"SN{i}"}} for i in range(n)]
+    r = client.post("/api/inventory/devices/bulk", json={"devices": devices, "actor": "t"})
+    assert r.status_code == 201, r.text
+    return r.json()
+
+def test_devices_bulk_links_each_laptop_to_its_item(client, session):
+    created = _devices(client, 3)
+    assert [d["laptop"]["item_id"] for d in created] == [d["item"]["id"] for d in created]
+    assert _count(session, Laptop) == 3
+    assert _count(session, InventoryHistory) == 3
+
+def test_devices_bulk_invalid_device_rejects_whole_batch(client, session):
+    devices = [{"item": {"sku": "OK", "name": "fine"}}, {"item": {"sku": "BAD"}}]  # second item has no name
+    r = client.post("/api/inventory/devices/bulk", json={"devices": devices})
+    assert r.status_code == 400, r.text
+    assert _count(session, InventoryItem) == 0
+    assert _count(session, Laptop) == 0
+
+def test_assign_bulk_marks_laptops_in_use(client, session):
+    items = [d["item"]["id"] for d in _devices(client, 2)]
+    r = client.post("/api/inventory/assign/bulk", json={"items": [{"item_id": i, "user_upn": f"u{i}@x"} for i in items]})
+    assert r.status_code == 201, r.text
+    laptops = session.scalars(select(Laptop).order_by(Laptop.item_id)).all()
+    assert [(l.status, l.assigned_to_upn) for l in laptops] == [("in_use", f"u{i}@x") for i in items]
+
+def test_assign_bulk_with_already_assigned_item_rejects_whole_batch(client, session):
+    first, second = (d["item"]["id"] for d in _devices(client, 2))
+    assert client.post("/api/inventory/assign", json={"item_id": first, "user_upn": "a@x"}).status_code == 201
+    r = client.post("/api/inventory/assign/bulk", json={"items": [{"item_id": second, "user_upn": "b@x"}, {"item_id": first, "user_upn": "b@x"}]})
+    assert r.status_code == 400, r.text
+    assert str(first) in r.json()["detail"]
+    laptop = session.scalars(select(Laptop).where(Laptop.item_id == second)).one()
+    assert laptop.status == "in_stock"
+    assert _count(session, Assignment) == 1
+
+def test_assign_bulk_unknown_item_is_404(client, session):
+    item = _devices(client, 1)[0]["item"]["id"]
+    r = client.post("/api/inventory/assign/bulk", json={"items": [{"item_id": item}, {"item_id": 999}]})
+    assert r.status_code == 404, r.text
+    assert _count(session, Assignment) == 0
+
+def test_assign_bulk_duplicate_item_is_rejected(client):
+    item = _devices(client, 1)[0]["item"]["id"]
+    r = client.post("/api/inventory/assign/bulk", json={"items": [{"item_id": item}, {"item_id": item}]})
+    assert r.status_code == 400, r.text
+
+def test_second_assign_of_same_device_is_rejected(client, session):
+    item = _devices(client, 1)[0]["item"]["id"]
+    assert client.post("/api/inventory/assign", json={"item_id": item, "user_upn": "a@x"}).status_code == 201
+    r = client.post("/api/inventory/assign", json={"item_id": item, "user_upn": "b@x"})
+    assert r.status_code == 400, r.text
+    assert _count(session, Assignment) == 1
+
+def test_double_assign_race_is_decided_by_the_conditional_update(client, session):
+    item = _devices(client, 1)[0]["item"]["id"]
+    laptop = session.scalars(select(Laptop).where(Laptop.item_id == item)).one()
+    # another request assigns the laptop after this session read it: the loaded object still says in_stock
+    session.execute(update(Laptop).where(Laptop.id == laptop.id).values(status="in_use"),
+                    execution_options={"synchronize_session": False})
+    session.commit()
+    assert laptop.status == "in_stock"
+    with pytest.raises(ValueError, match="already assigned"):
+        create_assignment_for_item(session, item, None, "late@x", "t")
+    assert _count(session, Assignment) == 0
+
+def test_bulk_delete_devices_partial_missing_id_is_404_and_deletes_nothing(client, session):
+    laptop = _devices(client, 1)[0]["laptop"]["id"]
+    r = client.post("/api/inventory/devices/bulk_delete", json={"ids": [laptop, 999]})
+    assert r.status_code == 404, r.text
+    assert _count(session, Laptop) == 1
+    assert _count(session, InventoryItem) == 1
+    r = client.post("/api/inventory/devices/bulk_delete", json={"ids": [laptop]})
+    assert r.status_code == 200, r.text
+    assert _count(session, Laptop) == 0
+    assert _count(session, InventoryItem) == 0
@@ -0,0 +1,22 @@
+def _version(client):
+    r = client.get("/api/inventory/version")
+    assert r.status_code == 200, r.text
+    return r.json()["version"]
+
+def test_version_moves_with_each_committed_write(client):
+    assert _version(client) == 0
+    item = client.post("/api/inventory/", json={"sku": "A", "name": "a"}).json()
+    assert _version(client) == 1
+    client.patch(f"/api/inventory/{item['id']}", json={"name": "b"})
+    client.post("/api/inventory/bulk_import", json={"items": [{"sku": f"B{i}", "name": "x"} for i in range(3)]})
+    assert _version(client) == 3
+
+def test_version_stays_put_on_a_rejected_write(client):
+    pool = client.post("/api/inventory/licenses", json={"sku": "L", "total": 1}).json()
+    client.post(f"/api/inventory/licenses/{pool['id']}/allocate/bulk", json={"items": [{"user_upn": "a@x"}]})
+    before = _version(client)
+    r = client.post(f"/api/inventory/licenses/{pool['id']}/allocate/bulk", json={"items": [{"user_upn": "b@x"}]})
+    assert r.status_code == 400, r.text
+    r = client.post("/api/inventory/licenses", json={"sku": "L", "total": 0})
+    assert r.status_code == 409, r.text
+    assert _version(client) == before